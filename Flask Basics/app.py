@@ -1,10 +1,23 @@
 from flask import Flask, jsonify, request, url_for, redirect, session, render_template, g
+import os
 import sqlite3
+import sys
+
+# O app roda de dentro da própria pasta: a raiz do repositório entra no sys.path para o pacote common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import migrate
+from common.templates import init_template_cache
 
 
 app = Flask(__name__) # app = instância da classe Flask / __name__ faz referencia ao módulo "app.py" que é o arquivo atual
 app.config['Debug'] = True
 app.config['SECRET_KEY'] = 'Thisisasecret!'
+DATABASE = 'data.db'
+
+migrate.init_app(app, DATABASE)  # 'flask db upgrade' aplica as migrações da pasta migrations/
+
+init_template_cache(app)  # Bytecode dos templates compartilhado pelos workers e 'flask precompile-templates'
 
 # -------------------------------------------------- DATABASE HELPER FUNCTIONS
 def connect_db():
@@ -12,7 +25,7 @@ def connect_db():
     Estabelece uma conexão com o banco de dados SQLite.
     Configura a fábrica de linhas para retornar dicionários ao invés de tuplas.
     """
-    sql = sqlite3.connect('data.db')
+    sql = sqlite3.connect(DATABASE)
     sql.row_factory = sqlite3.Row  # Retorna as linhas como dicionários ao invés de tuplas
     return sql
 
@@ -0,0 +1,6 @@
+-- Versão 1: a tabela users como foi criada à mão em data.db (IF NOT EXISTS: bancos existentes só passam para a versão 1).
+-- As consultas do app leem a tabela inteira, sem filtro, então não há índice a criar
+CREATE TABLE IF NOT EXISTS users(
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	name TEXT,
+	location TEXT);
@@ -0,0 +1,5 @@
+"""
+Código compartilhado pelos apps do repositório (food_tracker, member_api, qa_app e Flask Basics).
+Cada app é rodado de dentro da própria pasta, então o app coloca a raiz do repositório no sys.path
+antes de importar daqui (ver o database.py de cada app).
+"""
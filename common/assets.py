@@ -0,0 +1,114 @@
+from flask import request, send_from_directory
+import click
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+
+BUILD_FOLDER = 'static_build'  # Pasta (dentro da pasta do app) com os arquivos gerados por build()
+MANIFEST = 'manifest.json'  # Nome original -> nome com hash, dentro de BUILD_FOLDER
+MAX_AGE = 365 * 24 * 60 * 60  # Um arquivo com hash no nome nunca muda, então o navegador pode guardá-lo por um ano
+
+
+def build_folder(app):
+    return os.path.join(app.root_path, BUILD_FOLDER)
+
+def hashed_name(filename, content):
+    """
+    bootstrap.min.css -> bootstrap.min.<hash>.css, com o hash do conteúdo.
+    """
+    base, ext = os.path.splitext(filename)
+    return '{}.{}{}'.format(base, hashlib.sha256(content).hexdigest()[:12], ext)
+
+def build(app):
+    """
+    Copia cada arquivo de static/ para BUILD_FOLDER com o hash do conteúdo no nome, grava ao lado uma versão .gz
+    (quando ela é menor) e o manifest. Os arquivos de builds anteriores são mantidos, assim páginas antigas
+    ainda em cache continuam encontrando o CSS que usavam. Retorna o número de arquivos processados.
+    """
+    folder = build_folder(app)
+    manifest = {}
+    for root, dirs, files in os.walk(app.static_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                content = f.read()
+
+            manifest[filename] = hashed_name(filename, content)
+            target = os.path.join(folder, manifest[filename])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                with open(target + '.gz', 'wb') as f:
+                    f.write(compressed)
+
+    # O manifest é trocado de uma vez, para um worker que esteja subindo não ler um arquivo pela metade
+    with open(os.path.join(folder, MANIFEST + '.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(os.path.join(folder, MANIFEST + '.tmp'), os.path.join(folder, MANIFEST))
+    return len(manifest)
+
+def version(app):
+    """
+    Hash do manifest carregado pelo app ('' sem build): muda a cada build com algum arquivo diferente.
+    """
+    return app.extensions['assets']['version']
+
+def init_app(app):
+    """
+    Registra o comando 'flask build-static'. Se existir um build, faz url_for('static', filename=...) gerar
+    o nome com hash e troca a rota static por uma que serve esses arquivos com cache de um ano e, se o
+    navegador aceitar, já comprimidos em gzip. Sem build (ex.: desenvolvimento), tudo continua como no Flask padrão.
+    """
+    state = app.extensions['assets'] = {'manifest': {}, 'built': set(), 'version': ''}
+
+    @app.cli.command('build-static')
+    def build_static():
+        """Gera os arquivos de static/ com hash no nome e as versões .gz (rodar no build)."""
+        count = build(app)
+        click.echo('{} static files built into {}.'.format(count, build_folder(app)))
+
+    folder = build_folder(app)
+    try:
+        with open(os.path.join(folder, MANIFEST), 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return
+    state['manifest'] = json.loads(content)
+    state['version'] = hashlib.sha256(content).hexdigest()[:12]
+    # Inclui os arquivos de builds anteriores, ainda pedidos por páginas antigas em cache
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            if name != MANIFEST and not name.endswith('.gz'):
+                state['built'].add(os.path.relpath(os.path.join(root, name), folder).replace(os.sep, '/'))
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in state['manifest']:
+            values['filename'] = state['manifest'][values['filename']]
+
+    app.view_functions['static'] = lambda filename: send_static(app, filename)
+
+def send_static(app, filename):
+    """
+    Rota static: arquivos com hash vêm de BUILD_FOLDER, os demais de static/ como no Flask padrão.
+    """
+    if filename not in app.extensions['assets']['built']:
+        return app.send_static_file(filename)
+
+    folder = build_folder(app)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    gzip_ok = request.accept_encodings['gzip'] and os.path.exists(os.path.join(folder, filename + '.gz'))
+    response = send_from_directory(folder, filename + '.gz' if gzip_ok else filename, mimetype=mimetype, max_age=MAX_AGE)
+    if gzip_ok:
+        response.content_encoding = 'gzip'
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,35 @@
+import os
+import sqlite3
+import threading
+
+
+class CounterDatabase:
+    """
+    Banco SQLite pequeno de contadores (baldes do rate limit, falhas de login...), separado do banco
+    principal do app para não disputar o lock de escrita dele, e compartilhado pelos workers da máquina.
+
+    Os contadores não precisam sobreviver a uma queda da máquina, então synchronous = off evita
+    o fsync a cada escrita. As conexões são em modo autocommit: quem usa controla as transações.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema  # create table if not exists ..., executado em cada conexão nova
+        self._local = threading.local()
+
+    def connect(self):
+        sql = sqlite3.connect(self.path, isolation_level=None)  # Transações controladas manualmente
+        sql.execute('PRAGMA journal_mode = wal')
+        sql.execute('PRAGMA synchronous = off')
+        sql.execute('PRAGMA busy_timeout = 1000')
+        sql.execute(self.schema)
+        return sql
+
+    def get(self):
+        """
+        Uma conexão por thread, recriada depois de um fork.
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.sql = self.connect()
+            self._local.pid = os.getpid()
+        return self._local.sql
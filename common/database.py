@@ -0,0 +1,130 @@
+from flask import g
+import os
+import queue
+import sqlite3
+
+
+# PRAGMAs padrão aplicados em cada conexão nova do pool.
+# Podem ser alterados por banco com Database.configure() antes da primeira requisição.
+PRAGMAS = {
+    'journal_mode': 'wal',      # Leitores não bloqueiam o escritor (e vice-versa)
+    'synchronous': 'normal',    # Seguro com WAL e evita um fsync a cada commit
+    'cache_size': -16000,       # Valor negativo = KiB (~16 MB de cache de páginas por conexão)
+    'mmap_size': 268435456,     # 256 MB de leitura via memory-map
+    'busy_timeout': 5000,       # Espera até 5s pelo lock de escrita antes de 'database is locked'
+}
+
+POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))  # Conexões mantidas abertas por worker
+STATEMENT_CACHE_SIZE = 256  # O padrão do sqlite3 é 128 statements preparados por conexão
+
+
+class Database:
+    """
+    Um banco SQLite com um pool de conexões por worker.
+
+    Cada app cria o seu com o caminho do arquivo (ex.: Database('questions.db')). O caminho é lido
+    a cada conexão nova, então pode ser trocado (ex.: por uma cópia temporária nos benchmarks)
+    antes da primeira requisição.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pragmas = dict(PRAGMAS)
+        self.pool_size = POOL_SIZE
+        self.statement_cache_size = STATEMENT_CACHE_SIZE
+        self._pool = None
+        self._pool_pid = None
+
+    def configure(self, pool_size=None, statement_cache_size=None, **pragmas):
+        """
+        Altera o tamanho do pool, o cache de statements e/ou os PRAGMAs das próximas conexões.
+        Um PRAGMA com valor None é removido. O pool atual é descartado para que as novas
+        configurações valham para todas as conexões.
+        """
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if statement_cache_size is not None:
+            self.statement_cache_size = statement_cache_size
+        for name, value in pragmas.items():
+            if value is None:
+                self.pragmas.pop(name, None)
+            else:
+                self.pragmas[name] = value
+        self.close_pool()
+
+    def connect(self):
+        """
+        Estabelece uma conexão com o banco de dados SQLite.
+        Configura a fábrica de linhas para retornar dicionários ao invés de tuplas
+        e aplica os PRAGMAs do banco.
+        """
+        # check_same_thread=False: a conexão pode ser reutilizada por outra thread do mesmo worker,
+        # mas o pool garante que ela nunca é usada por duas requisições ao mesmo tempo
+        sql = sqlite3.connect(self.path, cached_statements=self.statement_cache_size, check_same_thread=False)
+        sql.row_factory = sqlite3.Row  # Retorna as linhas como dicionários ao invés de tuplas
+        for name, value in self.pragmas.items():
+            sql.execute('PRAGMA {} = {}'.format(name, value))
+        return sql
+
+    def init(self, script):
+        """
+        Executa um script SQL (ex.: schema.sql) numa conexão própria, fora do pool.
+        É chamada quando o app é carregado, então os comandos do script devem poder rodar
+        mais de uma vez (create table if not exists, create trigger if not exists...).
+        """
+        sql = self.connect()
+        with open(script) as f:
+            sql.executescript(f.read())
+        sql.close()
+
+    def _get_pool(self):
+        """
+        Retorna o pool do processo atual. Depois de um fork (workers do gunicorn) o pool
+        herdado do processo pai é ignorado e um novo é criado.
+        """
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = queue.LifoQueue(maxsize=self.pool_size)  # LIFO mantém as conexões mais "quentes" em uso
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def acquire(self):
+        """
+        Retira uma conexão do pool, ou cria uma nova se o pool estiver vazio.
+        """
+        try:
+            return self._get_pool().get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, sql):
+        """
+        Devolve uma conexão ao pool. Transações deixadas abertas (ex.: erro no meio da requisição)
+        são desfeitas. Se o pool estiver cheio, a conexão é fechada.
+        """
+        if sql.in_transaction:
+            sql.rollback()
+        try:
+            self._get_pool().put_nowait(sql)
+        except queue.Full:
+            sql.close()
+
+    def close_pool(self):
+        """
+        Fecha todas as conexões paradas no pool deste processo.
+        """
+        if self._pool is not None and self._pool_pid == os.getpid():
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+        self._pool = None
+
+    def get(self):
+        """
+        Obtém a conexão com o banco de dados armazenada em g.
+        Se não existir, retira uma conexão do pool e a armazena em g.
+        """
+        if not hasattr(g, 'sqlite_db'):  # Verifica se 'sqlite_db' não existe em 'g'
+            g.sqlite_db = self.acquire()  # Pega uma conexão do pool e armazena em 'g'
+        return g.sqlite_db
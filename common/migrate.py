@@ -0,0 +1,130 @@
+import click
+import importlib.util
+import os
+import re
+import sqlite3
+
+
+# Pasta com as migrações, dentro da pasta do app. Cada arquivo começa pelo número da versão que ele cria:
+# 0001_indexes.sql, 0002_alguma_coisa.py... Uma migração .py define upgrade(sql), que recebe a conexão já dentro
+# da transação (não use executescript nela, ele faz commit antes de rodar)
+MIGRATIONS_FOLDER = 'migrations'
+
+BUSY_TIMEOUT = 30000  # Milissegundos de espera pelo lock de escrita: os workers podem estar gravando durante o deploy
+
+
+def migrations(folder):
+    """
+    Lista (versão, caminho) das migrações da pasta, em ordem de versão.
+    """
+    found = []
+    for name in os.listdir(folder):
+        match = re.match(r'(\d+)_\w+\.(sql|py)$', name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(folder, name)))
+    found.sort()
+    versions = [version for version, path in found]
+    if len(set(versions)) != len(versions):
+        raise ValueError('Two migrations with the same version in {}'.format(folder))
+    return found
+
+def current_version(sql):
+    """
+    Versão do schema gravada no próprio banco (PRAGMA user_version, 0 num banco que nunca foi migrado).
+    """
+    return sql.execute('PRAGMA user_version').fetchone()[0]
+
+def pending(database, folder):
+    """
+    Migrações ainda não aplicadas no banco.
+    """
+    sql = sqlite3.connect(database)
+    try:
+        version = current_version(sql)
+    finally:
+        sql.close()
+    return [(number, path) for number, path in migrations(folder) if number > version]
+
+def statements(script):
+    """
+    Separa um script SQL em comandos. sqlite3.complete_statement sabe que o ; dentro do BEGIN...END
+    de um trigger não termina o comando.
+    """
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ''
+    if statement.strip():
+        yield statement
+
+def load(path):
+    """
+    Importa uma migração .py a partir do caminho do arquivo.
+    """
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def upgrade(database, folder):
+    """
+    Aplica as migrações pendentes, cada uma numa transação junto com a nova versão do banco: se uma falhar,
+    o banco fica na versão anterior a ela e as seguintes não rodam. O lock de escrita é pego antes de ler
+    a versão, então dois upgrades ao mesmo tempo não aplicam a mesma migração. Retorna os arquivos aplicados.
+    """
+    sql = sqlite3.connect(database, isolation_level=None)  # Transações controladas manualmente
+    sql.execute('PRAGMA busy_timeout = {}'.format(BUSY_TIMEOUT))
+    applied = []
+    try:
+        for version, path in migrations(folder):
+            sql.execute('begin immediate')
+            try:
+                if version <= current_version(sql):
+                    sql.execute('rollback')
+                    continue
+                if path.endswith('.sql'):
+                    # executescript faria commit antes de começar, então os comandos rodam um a um na transação
+                    with open(path) as f:
+                        for statement in statements(f.read()):
+                            sql.execute(statement)
+                else:
+                    load(path).upgrade(sql)
+                sql.execute('PRAGMA user_version = {}'.format(version))
+                sql.execute('commit')
+            except Exception:
+                sql.execute('rollback')
+                raise
+            applied.append(os.path.basename(path))
+    finally:
+        sql.close()
+    return applied
+
+def init_app(app, database):
+    """
+    Registra o grupo de comandos 'flask db' para o banco do app (arquivo database) e avisa no log
+    quando o banco ainda tem migrações pendentes.
+    """
+    app.extensions['migrate'] = {'database': database, 'folder': os.path.join(app.root_path, MIGRATIONS_FOLDER)}
+
+    @app.cli.group('db')
+    def db_cli():
+        """Migrações do banco de dados. A versão do schema fica no próprio banco, em PRAGMA user_version."""
+
+    @db_cli.command('upgrade')
+    def db_upgrade():
+        """Aplica as migrações pendentes, em ordem (rodar no deploy, antes de subir os workers)."""
+        for name in upgrade_app(app):
+            click.echo('Applied {}.'.format(name))
+        click.echo('{} is up to date.'.format(database))
+
+    if pending(database, app.extensions['migrate']['folder']):
+        app.logger.warning('%s has pending migrations, run "flask db upgrade".', database)
+
+def upgrade_app(app):
+    """
+    Aplica as migrações pendentes no banco registrado por init_app. Depois do schema.sql, que roda quando o app
+    é importado: as migrações podem usar as tabelas criadas por ele.
+    """
+    return upgrade(app.extensions['migrate']['database'], app.extensions['migrate']['folder'])
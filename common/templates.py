@@ -0,0 +1,33 @@
+from jinja2 import FileSystemBytecodeCache
+import click
+import os
+
+
+def template_cache_dir(app):
+    """
+    Pasta do bytecode dos templates do app: <app>/template_cache, ou <TEMPLATE_CACHE_DIR>/<pasta do app>
+    quando a variável de ambiente está definida (uma subpasta por app, assim o precompile-templates
+    de um app não apaga o bytecode dos outros).
+    """
+    if os.environ.get('TEMPLATE_CACHE_DIR'):
+        return os.path.join(os.environ['TEMPLATE_CACHE_DIR'], os.path.basename(app.root_path))
+    return os.path.join(app.root_path, 'template_cache')
+
+def init_template_cache(app):
+    """
+    Guarda o bytecode dos templates já compilados em disco, compartilhado por todos os workers da máquina,
+    e registra o comando 'flask precompile-templates', que o gera no build: um worker novo carrega
+    o bytecode em vez de compilar cada template.
+    """
+    cache_dir = template_cache_dir(app)
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    @app.cli.command('precompile-templates')
+    def precompile_templates():
+        """Compila todos os templates e grava o bytecode (rodar no build, antes de subir os workers)."""
+        app.jinja_env.bytecode_cache.clear()  # Descarta o bytecode de templates que mudaram ou não existem mais
+        names = app.jinja_env.list_templates()
+        for name in names:
+            app.jinja_env.get_template(name)
+        click.echo('{} templates compiled into {}.'.format(len(names), cache_dir))
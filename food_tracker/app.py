@@ -1,19 +1,30 @@
 from flask import Flask, render_template, request, g
 from datetime import datetime
-from database import get_db, connect_db
+from database import get_db, release_db
+from common import assets, migrate
+from common.templates import init_template_cache
+import database
 
 
 app = Flask(__name__)
 
+migrate.init_app(app, database.db.path)  # 'flask db upgrade' aplica as migrações da pasta migrations/
+
+init_template_cache(app)  # Bytecode dos templates compartilhado pelos workers e 'flask precompile-templates'
+
+# url_for('static') aponta para os arquivos com hash no nome gerados por 'flask build-static', servidos com cache de um ano e gzip
+assets.init_app(app)
+
 # -------------------------------------------------- DATABASE HELPER FUNCTIONS
 @app.teardown_appcontext
 def close_db(error):
     """
-    Fecha a conexão com o banco de dados armazenada em g, se existir.
+    Devolve ao pool a conexão com o banco de dados armazenada em g, se existir.
     Esta função é chamada automaticamente ao final de cada requisição.
+    A conexão continua aberta para ser reaproveitada pela próxima requisição do worker.
     """
     if hasattr(g, 'sqlite_db'):  # Verifica se 'sqlite_db' existe em 'g'
-        g.sqlite_db.close()  # Fecha a conexão com o banco de dados
+        release_db(g.pop('sqlite_db'))  # Devolve a conexão ao pool
 
 
 
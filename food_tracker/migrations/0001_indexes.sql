@@ -0,0 +1,9 @@
+-- Índices usados pelas consultas do app, aplicados uma vez por 'flask db upgrade' no deploy.
+-- O banco foi criado à mão com food_tracker.sql, só com as chaves primárias
+
+-- Página de um dia (/view/<date>) busca a data por entry_date, e a HOME lista os dias em ordem de data
+CREATE INDEX IF NOT EXISTS log_date_entry_date ON log_date (entry_date);
+
+-- Alimentos de um dia: a chave primária de food_date começa por food_id e não serve para buscar por log_date_id.
+-- Com food_id junto, o join até food não precisa ler a tabela food_date
+CREATE INDEX IF NOT EXISTS food_date_log_date ON food_date (log_date_id, food_id);
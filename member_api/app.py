@@ -1,93 +1,482 @@
-from flask import Flask, g, request, jsonify
-from database import get_db
+from flask import Flask, g, request, jsonify, url_for, Response, make_response, stream_with_context
+from database import get_db, release_db, init_db, connect_db
+from common import migrate
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+import database
+import ratelimit
+import csv
+import hashlib
+import io
+import math
+import json
+import os
+import sqlite3
+import time
+import click
 
 app = Flask(__name__)
 
+init_db('schema.sql')  # Cria as tabelas e triggers que ainda não existirem (os índices vêm das migrações)
 
+migrate.init_app(app, database.db.path)  # 'flask db upgrade' aplica as migrações da pasta migrations/
 
-api_username = 'admin'
-api_password = 'password'
+
+
+SECRET_KEY_FILE = 'secret_key'  # Fica na pasta do banco; criado quando o app sobe sem MEMBER_API_SECRET_KEY
+TOKEN_TTL = 15 * 60  # Segundos de validade de um token
+
+def load_secret_key():
+    """
+    O token é assinado com a SECRET_KEY, então todos os workers (e os reinícios) precisam da mesma chave.
+    Usa MEMBER_API_SECRET_KEY ou, sem ela, a chave guardada em SECRET_KEY_FILE, gerada na primeira vez.
+    O arquivo é criado de uma vez (os.link falha se outro worker já o criou), então workers subindo juntos
+    acabam todos lendo a mesma chave.
+    """
+    key = os.environ.get('MEMBER_API_SECRET_KEY')
+    if key:
+        return key
+    path = os.path.join(os.path.dirname(os.path.abspath(database.db.path)), SECRET_KEY_FILE)
+    if not os.path.exists(path):
+        tmp = '{}.{}'.format(path, os.getpid())
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            f.write(os.urandom(32).hex())
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    with open(path) as f:
+        return f.read().strip()
+
+app.config['SECRET_KEY'] = load_secret_key()
+
+token_serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='member-api-token')
 
 def protected(f):
+    """
+    Exige um header 'Authorization: Bearer <token>' obtido em POST /token.
+    A verificação é só a checagem da assinatura e da validade do token, sem acessar o banco.
+    """
     @wraps(f)
     def decorated(*args, **kwargs):
         auth = request.authorization
-        if auth and auth.username == api_username and auth.password == api_password:
-            return f(*args, **kwargs)
-        else:
+        if not (auth and auth.type == 'bearer' and auth.token):
+            return jsonify({'message' : 'Authentication Failed!'}), 403
+        try:
+            g.client = token_serializer.loads(auth.token, max_age=TOKEN_TTL)['client']
+        except BadSignature: # Inclui tokens expirados (SignatureExpired)
             return jsonify({'message' : 'Authentication Failed!'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
+def rate_limited(f):
+    """
+    Limita as rotas de escrita por cliente com um token bucket compartilhado entre os workers
+    (ver ratelimit.py). Sem token disponível responde 429 com Retry-After.
+    Deve vir depois de @protected, que define g.client.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            retry_after = ratelimit.take_token(g.get('client') or request.remote_addr)
+        except sqlite3.OperationalError:
+            retry_after = 0  # Se o banco dos baldes falhar, não derruba a escrita por causa do limite
+        if retry_after:
+            response = jsonify({'message' : 'Too many write requests, slow down.'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response
+        return f(*args, **kwargs)
     return decorated
 
 # --------------------- Database helpers -----------------------------
 @app.teardown_appcontext
 def close_db(error):
     """
-    Fecha a conexão com o banco de dados armazenada em g, se existir.
+    Devolve ao pool a conexão com o banco de dados armazenada em g, se existir.
     Esta função é chamada automaticamente ao final de cada requisição.
+    A conexão continua aberta para ser reaproveitada pela próxima requisição do worker.
     """
     if hasattr(g, 'sqlite_db'):  # Verifica se 'sqlite_db' existe em 'g'
-        g.sqlite_db.close()  # Fecha a conexão com o banco de dados
+        release_db(g.pop('sqlite_db'))  # Devolve a conexão ao pool
+
 
+def members_version():
+    """
+    Versão atual da tabela members, mantida pelos triggers do schema.sql.
+    É uma busca pela chave primária de uma tabela de uma linha, não toca na tabela members.
+    """
+    return get_db().execute("select version from data_version where name = 'members'").fetchone()['version']
 
+def conditional(f):
+    """
+    Adiciona um ETag forte às respostas GET e responde 304 quando o If-None-Match do cliente
+    ainda corresponde à versão atual, sem executar a rota.
+    O ETag inclui a query string, já que ela muda o conteúdo da resposta (paginação, filtros...).
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        etag = 'members-{}'.format(members_version())
+        if request.query_string:
+            etag += '-' + hashlib.sha1(request.query_string).hexdigest()[:16]
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        return response
+    return decorated
+
+# --------------------- Authentication -----------------------------
+@app.route('/token', methods=['POST'])
+def issue_token():
+    """
+    Troca as credenciais do cliente (Basic Auth) por um token assinado de curta duração.
+    O hash da senha é verificado só aqui, uma vez a cada TOKEN_TTL, e não a cada chamada da API.
+    """
+    auth = request.authorization
+    if auth and auth.type == 'basic':
+        client_cur = get_db().execute('select name, password from api_clients where name = ?', [auth.username])
+        client = client_cur.fetchone()
+        if client and check_password_hash(client['password'], auth.password):
+            token = token_serializer.dumps({'client': client['name']})
+            return jsonify({'access_token': token, 'token_type': 'Bearer', 'expires_in': TOKEN_TTL})
+
+    return jsonify({'message' : 'Authentication Failed!'}), 403
+
+@app.cli.command('create-client')
+@click.argument('name')
+@click.password_option()
+def create_client(name, password):
+    """Cadastra (ou troca a senha de) um cliente da API."""
+    sql = connect_db()
+    sql.execute('insert or replace into api_clients (name, password) values (?, ?)', [name, generate_password_hash(password)])
+    sql.commit()
+    sql.close()
+    click.echo('Client {} saved.'.format(name))
+
+
+MAX_PAGE_SIZE = 1000  # Maior valor aceito em ?limit=
+STREAM_CHUNK_SIZE = 500  # Linhas lidas do cursor por vez no modo sem paginação
+MEMBER_COLUMNS = ('id', 'name', 'email', 'level')  # Campos que podem ser pedidos em ?fields=
+MEMBER_FILTERS = ('level', 'email')  # Filtros por igualdade aceitos na listagem, com índices em migrations/0001_indexes.sql e 0003_filter_sort_indexes.sql (com sort=name)
+MEMBER_SORTS = {  # Valores de ?sort= -> (coluna, ordem decrescente)
+    'id': ('id', False),
+    '-id': ('id', True),
+    'name': ('name', False),
+    '-name': ('name', True),
+}
+
+# Faixa do INTEGER do SQLite. Um int do Python fora dela levanta OverflowError no execute (não é sqlite3.Error)
+SQLITE_MIN_INT = -2 ** 63
+SQLITE_MAX_INT = 2 ** 63 - 1
+
+def is_member_id(value):
+    """
+    Confere um id vindo de JSON: precisa ser int dentro da faixa do INTEGER do SQLite.
+    bool é recusado, senão true viraria o membro 1.
+    """
+    return isinstance(value, int) and not isinstance(value, bool) and SQLITE_MIN_INT <= value <= SQLITE_MAX_INT
+
+def requested_fields():
+    """
+    Lê ?fields=id,name e confere cada campo com MEMBER_COLUMNS.
+    Sem o parâmetro, retorna todos os campos. Levanta ValueError para campos desconhecidos.
+    """
+    fields = request.args.get('fields')
+    if fields is None:
+        return MEMBER_COLUMNS
+    fields = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))  # Remove repetidos, mantém a ordem
+    invalid = [field for field in fields if field not in MEMBER_COLUMNS]
+    if invalid or not fields:
+        raise ValueError('Invalid fields: {}. Allowed: {}'.format(', '.join(invalid) or '(none)', ', '.join(MEMBER_COLUMNS)))
+    return fields
+
+def int_arg(name, default=None):
+    """
+    Lê um parâmetro inteiro da query string, ou default se ele não veio. Levanta ValueError se ele veio
+    mas não é um inteiro (request.args.get(type=int) devolveria None, e ?limit=abc viraria a lista inteira)
+    ou se está fora da faixa do INTEGER do SQLite.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError('{} must be an integer'.format(name))
+    if not SQLITE_MIN_INT <= value <= SQLITE_MAX_INT:
+        raise ValueError('{} must be between {} and {}'.format(name, SQLITE_MIN_INT, SQLITE_MAX_INT))
+    return value
+
+def select_columns(fields, sort_column='id'):
+    """
+    Lista de colunas do SELECT. O id (é o rowid, não custa nada) e a coluna de ordenação
+    vão sempre juntos porque a paginação precisa deles para montar o cursor da próxima página.
+    """
+    columns = ('id',) if sort_column == 'id' else ('id', sort_column)
+    return ', '.join(columns + tuple(field for field in fields if field not in columns))
+
+def members_query(fields, filters, sort, after=None, limit=None):
+    """
+    Monta o SELECT (sql, parâmetros) da listagem de membros.
+    filters é um dict {coluna: valor} com colunas de MEMBER_FILTERS, sort uma chave de MEMBER_SORTS e
+    after o par (valor da coluna de ordenação, id) do último item da página anterior.
+    A ordenação sempre desempata pelo id, para o cursor nunca pular ou repetir linhas.
+    """
+    column, descending = MEMBER_SORTS[sort]
+    where = []
+    params = []
+    for name, value in filters.items():
+        where.append('{} = ?'.format(name))
+        params.append(value)
+
+    comparison = '<' if descending else '>'
+    direction = ' desc' if descending else ''
+    if column == 'id':
+        order = 'id' + direction
+        if after is not None:
+            where.append('id {} ?'.format(comparison))
+            params.append(after[1])
+    else:
+        order = '{0}{1}, id{1}'.format(column, direction)
+        if after is not None:
+            where.append('({}, id) {} (?, ?)'.format(column, comparison))
+            params.extend(after)
+
+    sql = 'select {} from members'.format(select_columns(fields, column))
+    if where:
+        sql += ' where ' + ' and '.join(where)
+    sql += ' order by ' + order
+    if limit is not None:
+        sql += ' limit ?'
+        params.append(limit)
+    return sql, params
+
+def member_to_dict(row, fields=MEMBER_COLUMNS):
+    return {field : row[field] for field in fields}
+
+def stream_members(cur, fields):
+    """
+    Gera o JSON {"members": [...]} aos poucos, lendo o cursor em blocos.
+    Nenhum momento a tabela inteira fica na memória, independente do tamanho.
+    """
+    yield '{"members": ['
+    first = True
+    rows = cur.fetchmany(STREAM_CHUNK_SIZE)
+    while rows:
+        chunk = ', '.join(app.json.dumps(member_to_dict(row, fields)) for row in rows)
+        yield chunk if first else ', ' + chunk
+        first = False
+        rows = cur.fetchmany(STREAM_CHUNK_SIZE)
+    yield ']}'
 
 @app.route('/member', methods=['GET'])
 @protected
+@conditional
 def get_members():
+    """
+    Lista os membros.
+    Com ?limit= usa paginação por keyset (?after_id=, e ?after_name= quando ordenado por nome,
+    identificam o último item da página anterior) e devolve o link 'next' para a próxima página.
+    Sem ?limit= a lista inteira é enviada em streaming.
+    ?fields=id,name limita as colunas lidas do banco e enviadas na resposta.
+    ?level=, ?email= filtram e ?sort=id|-id|name|-name ordena, todos servidos por índices.
+    ?ids=1,2,3 busca vários membros de uma vez (ver members_by_ids).
+    """
+    if 'ids' in request.args:
+        try:
+            member_ids = [int(member_id) for member_id in request.args['ids'].split(',') if member_id.strip()]
+        except ValueError:
+            member_ids = None
+        if member_ids is None or not all(is_member_id(member_id) for member_id in member_ids):
+            return jsonify({'message' : 'ids must be a comma-separated list of integers'}), 400
+        return members_by_ids(member_ids)
+
+    sort = request.args.get('sort', 'id')
+    filters = {name : request.args[name] for name in MEMBER_FILTERS if name in request.args}
+    try:
+        limit = int_arg('limit')
+        after_id = int_arg('after_id')
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'message' : str(e)}), 400
+
+    if sort not in MEMBER_SORTS:
+        return jsonify({'message' : 'sort must be one of: {}'.format(', '.join(MEMBER_SORTS))}), 400
+    column = MEMBER_SORTS[sort][0]
+
+    after = None
+    if after_id is not None:
+        after_value = after_id if column == 'id' else request.args.get('after_' + column)
+        if after_value is None:
+            return jsonify({'message' : 'after_{} is required with sort={}'.format(column, sort)}), 400
+        after = (after_value, after_id)
+
     db = get_db()
-    members_cur = db.execute('select * from members')
-    members = members_cur.fetchall()
-    
-    #members_dic = [id, name, email, level in members]
-    member_list = []
-    for row in members:
-        dic = {}
-        dic['id'] = row['id']
-        dic['name'] = row['name']
-        dic['email'] = row['email']
-        dic['level'] = row['level']
-        member_list.append(dic)
-
-    return jsonify({'members': member_list})
+
+    if limit is None:
+        sql, params = members_query(fields, filters, sort, after)
+        members_cur = db.execute(sql, params)
+        return Response(stream_with_context(stream_members(members_cur, fields)), mimetype='application/json')
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'message' : 'limit must be between 1 and {}'.format(MAX_PAGE_SIZE)}), 400
+
+    # Busca uma linha a mais para saber se existe uma próxima página
+    sql, params = members_query(fields, filters, sort, after, limit + 1)
+    members = db.execute(sql, params).fetchall()
+
+    member_list = [member_to_dict(row, fields) for row in members[:limit]]
+
+    next_url = None
+    if len(members) > limit:
+        last = members[limit - 1]
+        cursor = {'after_id': last['id']}
+        if column != 'id':
+            cursor['after_' + column] = last[column]
+        next_url = url_for('get_members', **dict(request.args.to_dict(), **cursor))
+
+    return jsonify({'members': member_list, 'next': next_url})
     
+IDS_CHUNK_SIZE = 500  # Ids por consulta "where id in (...)", abaixo do limite de parâmetros do SQLite
+
+def members_by_ids(member_ids):
+    """
+    Busca uma lista de ids com consultas "where id in (...)" de até IDS_CHUNK_SIZE ids.
+    Retorna os membros na ordem pedida e a lista 'missing' com os ids que não existem.
+    """
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'message' : str(e)}), 400
+
+    member_ids = list(dict.fromkeys(member_ids))  # Remove repetidos, mantém a ordem pedida
+    if len(member_ids) > MAX_PAGE_SIZE:
+        return jsonify({'message' : 'At most {} ids per request'.format(MAX_PAGE_SIZE)}), 400
+
+    db = get_db()
+    found = {}
+    for start in range(0, len(member_ids), IDS_CHUNK_SIZE):
+        chunk = member_ids[start:start + IDS_CHUNK_SIZE]
+        members_cur = db.execute('select {} from members where id in ({})'.format(select_columns(fields), ', '.join('?' * len(chunk))), chunk)
+        for row in members_cur:
+            found[row['id']] = member_to_dict(row, fields)
+
+    return jsonify({'members': [found[member_id] for member_id in member_ids if member_id in found],
+                    'missing': [member_id for member_id in member_ids if member_id not in found]})
+
+@app.route('/member/lookup', methods=['POST'])
+@protected
+def lookup_members():
+    """
+    Mesma busca do GET /member?ids=, para listas longas demais para a URL: corpo {"ids": [1, 2, 3]}.
+    """
+    member_ids = (request.get_json() or {}).get('ids')
+    if not isinstance(member_ids, list) or not all(is_member_id(member_id) for member_id in member_ids):
+        return jsonify({'message' : 'Expected {"ids": [integers]}'}), 400
+    return members_by_ids(member_ids)
+
 @app.route('/member/<int:member_id>', methods=['GET'])
 @protected
+@conditional
 def get_member(member_id):
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'message' : str(e)}), 400
+
     db = get_db()
-    member_cur = db.execute('select * from members where id = ?', [member_id])
+    member_cur = db.execute('select {} from members where id = ?'.format(select_columns(fields)), [member_id])
     member = member_cur.fetchone()
+    if member is None:
+        return jsonify({'message' : 'Member not found'}), 404
 
-    return jsonify({'member':{'id' : member['id'], 'name' : member['name'], 'email' : member['email'], 'level' : member['level']}})
+    return jsonify({'member': member_to_dict(member, fields)})
+
+IDEMPOTENCY_TTL = 24 * 60 * 60  # Segundos que uma resposta fica guardada para o mesmo Idempotency-Key
+
+def request_hash(data):
+    """
+    Impressão digital do corpo da requisição, para detectar o mesmo Idempotency-Key
+    reutilizado com dados diferentes.
+    """
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
 
 @app.route('/member', methods=['POST'])
 @protected
+@rate_limited
 def add_member():
     new_member_data = request.get_json()
     name = new_member_data['name']
     email = new_member_data['email']
     level = new_member_data['level']
     
+    idempotency_key = request.headers.get('Idempotency-Key')
+
     db = get_db()
-    
-    db.execute('insert into members (name, email, level) values (?,?,?)',   [name,email,level])
+
+    if idempotency_key:
+        fingerprint = request_hash(new_member_data)
+        db.execute('begin immediate')  # Serializa requisições concorrentes com o mesmo Idempotency-Key
+        db.execute('delete from idempotency_keys where created_at < ?', [time.time() - IDEMPOTENCY_TTL])
+        # A chave vale só para o cliente que a enviou (g.client, do token)
+        stored = db.execute('select request_hash, status, response from idempotency_keys where client = ? and key = ?',
+                            [g.client, idempotency_key]).fetchone()
+        if stored:
+            db.commit()
+            if stored['request_hash'] != fingerprint:
+                return jsonify({'message' : 'Idempotency-Key was already used with a different request'}), 422
+            # Retry do cliente: devolve a resposta guardada sem inserir de novo
+            response = Response(stored['response'], status=stored['status'], mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+    member_cur = db.execute('insert into members (name, email, level) values (?,?,?)',   [name,email,level])
+
+    # A resposta é montada com o id gerado pelo insert, sem precisar buscar o membro de volta
+    body = app.json.dumps({'member':{'id' : member_cur.lastrowid, 'name' : name, 'email' : email, 'level' : level}})
+
+    if idempotency_key:
+        db.execute('insert into idempotency_keys (client, key, request_hash, status, response, created_at) values (?, ?, ?, ?, ?, ?)',
+                   [g.client, idempotency_key, fingerprint, 200, body, time.time()])
     db.commit()
-    
-    member_cur = db.execute('select * from members where name = ?', [name])
-    new_member = member_cur.fetchone()
 
-    return jsonify({'member':{'id' : new_member['id'], 'name' : new_member['name'], 'email' : new_member['email'], 'level' : new_member['level']}})
+    return Response(body, mimetype='application/json')
+
+MEMBER_FIELDS = ('name', 'email', 'level')  # Colunas que o cliente pode escrever
 
 @app.route('/member/<int:member_id>', methods=['PUT', 'PATCH'])
 @protected
+@rate_limited
 def edit_member(member_id):
     new_member_data = request.get_json()
-    name = new_member_data['name']
-    email = new_member_data['email']
-    level = new_member_data['level']
-    
+
+    # PUT substitui o membro inteiro, PATCH escreve apenas os campos enviados
+    if request.method == 'PUT':
+        fields = MEMBER_FIELDS
+    else:
+        fields = [field for field in MEMBER_FIELDS if field in new_member_data]
+        if not fields:
+            return jsonify({'message' : 'No fields to update'}), 400
+
+    missing = [field for field in fields if field not in new_member_data]
+    if missing:
+        return jsonify({'message' : 'Missing fields: {}'.format(', '.join(missing))}), 400
+    try:
+        check_member_values(new_member_data, fields)  # Um null só falharia no banco, com 500
+    except ValueError as e:
+        return jsonify({'message' : str(e)}), 400
 
     db = get_db()
-    db.execute('update members set name = ?, email = ?, level = ? where id = ?', [name, email, level, member_id])
+    db.execute('update members set {} where id = ?'.format(', '.join('{} = ?'.format(field) for field in fields)),
+               [new_member_data[field] for field in fields] + [member_id])
     db.commit()
 
 
@@ -95,6 +484,7 @@ def edit_member(member_id):
 
 @app.route('/member/<int:member_id>', methods=['DELETE'])
 @protected
+@rate_limited
 def delete_member(member_id):
     
     db = get_db()
@@ -104,7 +494,454 @@ def delete_member(member_id):
 
     return 'This removes a member by ID.'
 
+# --------------------- Bulk operations -----------------------------
+BULK_CHUNK_SIZE = 500  # Operações aplicadas por transação
+
+def read_bulk_operations():
+    """
+    Lê as operações enviadas para /member/bulk.
+    Aceita um array JSON ou NDJSON (Content-Type: application/x-ndjson, uma operação por linha).
+    O NDJSON é lido linha a linha do corpo da requisição, sem carregar o corpo inteiro.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield app.json.loads(line)
+                except ValueError:
+                    yield None  # Linha inválida, vira um erro no resultado do item
+    else:
+        operations = request.get_json()
+        if isinstance(operations, dict):
+            operations = operations.get('operations')
+        if not isinstance(operations, list):
+            raise ValueError('Expected a JSON array of operations')
+        yield from operations
+
+def check_member_values(operation, fields):
+    """
+    Levanta ValueError se algum campo for null ou não for um valor simples (objeto, lista).
+    Assim o erro fica só no item, em vez de derrubar no banco a transação do bloco inteiro.
+    """
+    invalid = [field for field in fields if operation[field] is None or isinstance(operation[field], (dict, list))]
+    if invalid:
+        raise ValueError('Fields must be non-null scalar values: {}'.format(', '.join(invalid)))
+
+def parse_bulk_operation(operation):
+    """
+    Valida uma operação e retorna (tipo, campos, parâmetros) ou levanta ValueError.
+    O tipo e os campos definem qual statement será usado no executemany.
+    """
+    if not isinstance(operation, dict):
+        raise ValueError('Operation must be a JSON object')
+
+    op = operation.get('op')
+    if op == 'create':
+        missing = [field for field in MEMBER_FIELDS if field not in operation]
+        if missing:
+            raise ValueError('Missing fields: {}'.format(', '.join(missing)))
+        check_member_values(operation, MEMBER_FIELDS)
+        return op, MEMBER_FIELDS, [operation[field] for field in MEMBER_FIELDS]
+
+    if op in ('update', 'delete'):
+        member_id = operation.get('id')
+        if not is_member_id(member_id):
+            raise ValueError('Operation requires an integer id')
+        if op == 'delete':
+            return op, (), [member_id]
+        # Update parcial: apenas os campos enviados são escritos
+        fields = tuple(field for field in MEMBER_FIELDS if field in operation)
+        if not fields:
+            raise ValueError('No fields to update')
+        check_member_values(operation, fields)
+        return op, fields, [operation[field] for field in fields] + [member_id]
+
+    raise ValueError("op must be 'create', 'update' or 'delete'")
+
+def existing_member_ids(db, member_ids):
+    cur = db.execute('select id from members where id in ({})'.format(', '.join('?' * len(member_ids))), member_ids)
+    return {row['id'] for row in cur}
+
+def apply_bulk_run(db, op, fields, items, results):
+    """
+    Aplica com um único executemany uma sequência de operações do mesmo tipo e com os mesmos campos.
+    """
+    if op == 'create':
+        db.executemany('insert into members ({}) values ({})'.format(', '.join(fields), ', '.join('?' * len(fields))),
+                       [params for index, params in items])
+        # Com a transação aberta ninguém mais escreve, então os ids são sequenciais até o último inserido
+        last_id = db.execute('select last_insert_rowid()').fetchone()[0]
+        first_id = last_id - len(items) + 1
+        for offset, (index, params) in enumerate(items):
+            results[index] = {'index': index, 'status': 'created', 'id': first_id + offset}
+        return
+
+    existing = existing_member_ids(db, [params[-1] for index, params in items])
+    found = [(index, params) for index, params in items if params[-1] in existing]
+    for index, params in items:
+        if params[-1] not in existing:
+            results[index] = {'index': index, 'status': 'not_found', 'id': params[-1]}
+
+    if op == 'update':
+        sql = 'update members set {} where id = ?'.format(', '.join('{} = ?'.format(field) for field in fields))
+    else:
+        sql = 'delete from members where id = ?'
+    db.executemany(sql, [params for index, params in found])
+    for index, params in found:
+        results[index] = {'index': index, 'status': op + 'd', 'id': params[-1]}
+
+def apply_bulk_chunk(db, chunk, results):
+    """
+    Aplica um bloco de operações numa única transação.
+    Operações consecutivas do mesmo tipo são agrupadas num executemany, mantendo a ordem original.
+    """
+    runs = []
+    for index, op, fields, params in chunk:
+        if runs and runs[-1][0] == op and runs[-1][1] == fields:
+            runs[-1][2].append((index, params))
+        else:
+            runs.append((op, fields, [(index, params)]))
+
+    try:
+        db.execute('begin immediate')  # Pega o lock de escrita logo no início da transação
+        for op, fields, items in runs:
+            apply_bulk_run(db, op, fields, items, results)
+        db.commit()
+    except sqlite3.Error:
+        db.rollback()
+        apply_bulk_items(db, chunk, results)
+
+def apply_bulk_items(db, chunk, results):
+    """
+    Refaz um bloco que falhou, uma operação por vez, cada uma no seu SAVEPOINT dentro de uma única transação:
+    só a operação que causou o erro é marcada como 'error', as outras são aplicadas normalmente.
+    """
+    db.execute('begin immediate')
+    for index, op, fields, params in chunk:
+        db.execute('savepoint bulk_item')
+        try:
+            apply_bulk_run(db, op, fields, [(index, params)], results)
+            db.execute('release bulk_item')
+        except sqlite3.Error as e:
+            db.execute('rollback to bulk_item')
+            db.execute('release bulk_item')
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+    db.commit()
+
+@app.route('/member/bulk', methods=['POST'])
+@protected
+@rate_limited
+def bulk_members():
+    """
+    Aplica uma lista de operações create/update/delete em blocos transacionais.
+    Cada operação é um objeto {"op": "create"|"update"|"delete", "id": ..., "name": ..., ...}.
+    Retorna o resultado de cada item, na mesma ordem do envio.
+    """
+    db = get_db()
+    results = {}
+    chunk = []
+
+    try:
+        for index, operation in enumerate(read_bulk_operations()):
+            try:
+                op, fields, params = parse_bulk_operation(operation)
+            except ValueError as e:
+                results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+                continue
+
+            chunk.append((index, op, fields, params))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                apply_bulk_chunk(db, chunk, results)
+                chunk = []
+    except ValueError as e:
+        return jsonify({'message' : str(e)}), 400
+
+    if chunk:
+        apply_bulk_chunk(db, chunk, results)
+
+    result_list = [results[index] for index in sorted(results)]
+    summary = {}
+    for result in result_list:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+
+    return jsonify({'results': result_list, 'summary': summary})
+
+
+# --------------------- Export / import -----------------------------
+IMPORT_CHUNK_SIZE = 1000  # Linhas inseridas por transação no import
+MAX_IMPORT_ERRORS = 20  # Quantos erros de linha são detalhados na resposta do import
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}  # Formatos aceitos no export e no import
+
+def export_rows(cur, format):
+    """
+    Gera o export em blocos de STREAM_CHUNK_SIZE linhas lidas do cursor.
+    """
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(MEMBER_COLUMNS)
+    rows = cur.fetchmany(STREAM_CHUNK_SIZE)
+    while rows:
+        if format == 'csv':
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            yield ''.join(app.json.dumps(member_to_dict(row)) + '\n' for row in rows)
+        rows = cur.fetchmany(STREAM_CHUNK_SIZE)
+    if format == 'csv' and buffer.tell():
+        yield buffer.getvalue()  # Só o cabeçalho, tabela vazia
+
+@app.route('/member/export', methods=['GET'])
+@protected
+def export_members():
+    """
+    Exporta a tabela inteira em ?format=ndjson (padrão) ou csv, em streaming direto do cursor.
+    """
+    format = request.args.get('format', 'ndjson')
+    if format not in EXPORT_MIMETYPES:
+        return jsonify({'message' : 'format must be one of: {}'.format(', '.join(EXPORT_MIMETYPES))}), 400
+
+    members_cur = get_db().execute('select {} from members order by id'.format(', '.join(MEMBER_COLUMNS)))
+    response = Response(stream_with_context(export_rows(members_cur, format)), mimetype=EXPORT_MIMETYPES[format])
+    response.headers['Content-Disposition'] = 'attachment; filename=members.{}'.format(format)
+    return response
+
+def read_import_rows(format):
+    """
+    Lê o corpo da requisição linha a linha e gera um dict por membro (ou None para linha inválida).
+    """
+    lines = (line.decode('utf-8') for line in request.stream)
+    if format == 'csv':
+        yield from csv.DictReader(lines)  # A primeira linha é o cabeçalho (id opcional, name, email, level)
+    else:
+        for line in lines:
+            if line.strip():
+                try:
+                    yield app.json.loads(line)
+                except ValueError:
+                    yield None
+
+def insert_import_chunk(db, chunk):
+    """
+    Insere um bloco de (linha, registro) numa transação. Registros com id substituem o membro com o mesmo id,
+    o que permite rodar o mesmo import de novo. Se o bloco falhar, ele é refeito registro a registro, para que
+    só as linhas com problema fiquem de fora. Retorna a lista de (linha, erro) das linhas não gravadas.
+    """
+    with_id = [[row['id']] + [row[field] for field in MEMBER_FIELDS] for line, row in chunk if row['id'] is not None]
+    without_id = [[row[field] for field in MEMBER_FIELDS] for line, row in chunk if row['id'] is None]
+    try:
+        db.execute('begin immediate')
+        db.executemany('insert or replace into members (id, name, email, level) values (?, ?, ?, ?)', with_id)
+        db.executemany('insert into members (name, email, level) values (?, ?, ?)', without_id)
+        db.commit()
+        return []
+    except sqlite3.Error:
+        db.rollback()
+    return insert_import_rows(db, chunk)
+
+def insert_import_rows(db, chunk):
+    """
+    Insere os registros um a um, cada um no seu SAVEPOINT dentro de uma única transação.
+    Retorna a lista de (linha, erro) dos registros que falharam.
+    """
+    failures = []
+    db.execute('begin immediate')
+    for line, row in chunk:
+        db.execute('savepoint import_row')
+        try:
+            if row['id'] is None:
+                db.execute('insert into members (name, email, level) values (?, ?, ?)', [row[field] for field in MEMBER_FIELDS])
+            else:
+                db.execute('insert or replace into members (id, name, email, level) values (?, ?, ?, ?)',
+                           [row['id']] + [row[field] for field in MEMBER_FIELDS])
+            db.execute('release import_row')
+        except sqlite3.Error as e:
+            db.execute('rollback to import_row')
+            db.execute('release import_row')
+            failures.append((line, str(e)))
+    db.commit()
+    return failures
+
+def import_member_id(value):
+    """
+    id de uma linha do import: vazio vira None (o banco escolhe o id), senão precisa ser um inteiro
+    (no CSV chega como texto) dentro da faixa do INTEGER do SQLite. Levanta ValueError para qualquer outro valor.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError('id must be an integer')
+    try:
+        member_id = int(value)
+    except ValueError:
+        raise ValueError('id must be an integer')
+    if not is_member_id(member_id):
+        raise ValueError('id must be between {} and {}'.format(SQLITE_MIN_INT, SQLITE_MAX_INT))
+    return member_id
+
+@app.route('/member/import', methods=['POST'])
+@protected
+@rate_limited
+def import_members():
+    """
+    Importa membros enviados como NDJSON (application/x-ndjson) ou CSV (text/csv, ou ?format=csv).
+    O corpo é lido aos poucos e gravado em transações de IMPORT_CHUNK_SIZE linhas com executemany,
+    então a memória usada não depende do tamanho do arquivo.
+    """
+    format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if format not in EXPORT_MIMETYPES:
+        return jsonify({'message' : 'format must be one of: {}'.format(', '.join(EXPORT_MIMETYPES))}), 400
+
+    db = get_db()
+    start = time.perf_counter()
+    imported = 0
+    failed = 0
+    errors = []
+    chunk = []
+
+    def fail(line, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append({'row': line, 'error': message})
+
+    def flush():
+        nonlocal imported
+        failures = insert_import_chunk(db, chunk)
+        imported += len(chunk) - len(failures)
+        for line, message in failures:
+            fail(line, message)
+        chunk.clear()
+
+    for line, row in enumerate(read_import_rows(format), start=1):
+        if not isinstance(row, dict):
+            fail(line, 'Invalid JSON object')
+            continue
+        missing = [field for field in MEMBER_FIELDS if not row.get(field)]
+        if missing:
+            fail(line, 'Missing fields: {}'.format(', '.join(missing)))
+            continue
+        # Valores inválidos são recusados aqui, na linha, e não derrubam a transação do bloco
+        try:
+            check_member_values(row, MEMBER_FIELDS)
+            row['id'] = import_member_id(row.get('id'))
+        except ValueError as e:
+            fail(line, str(e))
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    return jsonify({'imported': imported, 'failed': failed, 'errors': errors,
+                    'seconds': round(elapsed, 3), 'rows_per_second': round(imported / elapsed) if elapsed else imported})
+
+# --------------------- Change feed -----------------------------
+MAX_WAIT = 30  # Maior ?wait= aceito no long-poll, em segundos
+POLL_INTERVAL = 0.5  # Intervalo entre as checagens de novas alterações durante o long-poll
+
+def last_change_seq(db):
+    return db.execute('select coalesce(max(seq), 0) from member_changes').fetchone()[0]
+
+@app.route('/member/changes', methods=['GET'])
+@protected
+def get_member_changes():
+    """
+    Alterações em members depois de ?since=<seq>, em ordem.
+    Inserts e updates trazem o estado atual do membro (null se ele já foi excluído depois);
+    exclusões vêm como tombstones {"op": "delete"}. O cliente guarda o 'last_seq' da resposta
+    e o usa como ?since= na próxima chamada.
+    Sem ?since= retorna apenas o last_seq atual, para marcar o ponto de partida antes de baixar a lista completa.
+    Com ?wait=<segundos> a requisição espera até surgir alguma alteração ou o tempo acabar (long-poll).
+    """
+    try:
+        since = int_arg('since')
+        limit = int_arg('limit', MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'message' : str(e)}), 400
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = math.nan
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'message' : 'limit must be between 1 and {}'.format(MAX_PAGE_SIZE)}), 400
+    # nan e inf passariam pelo min() abaixo e a espera não terminaria nunca
+    if not math.isfinite(wait) or wait < 0:
+        return jsonify({'message' : 'wait must be a number of seconds between 0 and {}'.format(MAX_WAIT)}), 400
+    wait = min(wait, MAX_WAIT)
+
+    db = get_db()
+
+    if since is None:
+        return jsonify({'changes': [], 'last_seq': last_change_seq(db), 'has_more': False})
+
+    # Um since além da última alteração não é devolvido como last_seq: o cliente pularia as próximas alterações
+    since = min(since, last_change_seq(db))
+
+    deadline = time.monotonic() + wait
+    # A checagem é uma busca pela chave primária, barata mesmo repetida durante o long-poll
+    while not db.execute('select 1 from member_changes where seq > ? limit 1', [since]).fetchone():
+        if time.monotonic() >= deadline:
+            return jsonify({'changes': [], 'last_seq': since, 'has_more': False})
+        time.sleep(POLL_INTERVAL)
+
+    changes_cur = db.execute('''select
+                                    member_changes.seq,
+                                    member_changes.member_id,
+                                    member_changes.op,
+                                    members.name,
+                                    members.email,
+                                    members.level
+                                from member_changes left join members on members.id = member_changes.member_id
+                                where member_changes.seq > ?
+                                order by member_changes.seq
+                                limit ?''', [since, limit + 1])
+    changes = changes_cur.fetchall()
+
+    change_list = []
+    for row in changes[:limit]:
+        change = {'seq': row['seq'], 'id': row['member_id'], 'op': row['op']}
+        if row['op'] != 'delete':
+            change['member'] = None if row['name'] is None else {'id': row['member_id'], 'name': row['name'], 'email': row['email'], 'level': row['level']}
+        change_list.append(change)
+
+    return jsonify({'changes': change_list, 'last_seq': change_list[-1]['seq'], 'has_more': len(changes) > limit})
 
+@app.cli.command('check-query-plans')
+def check_query_plans():
+    """Confere com EXPLAIN QUERY PLAN que os filtros e ordenações da listagem usam índices."""
+    cases = [
+        ('?level=', {'level': 'Premium'}, 'id', 'members_level'),
+        ('?email=', {'email': 'joe@email.com'}, 'id', 'members_email'),
+        ('?sort=name', {}, 'name', 'members_name'),
+        ('?sort=-name', {}, '-name', 'members_name'),
+        ('?level=&sort=-id', {'level': 'Premium'}, '-id', 'members_level'),
+        ('?level=&sort=name', {'level': 'Premium'}, 'name', 'members_level_name'),
+        ('?level=&sort=-name', {'level': 'Premium'}, '-name', 'members_level_name'),
+        ('?email=&sort=name', {'email': 'joe@email.com'}, 'name', 'members_email_name'),
+        ('?email=&sort=-name', {'email': 'joe@email.com'}, '-name', 'members_email_name'),
+    ]
+    sql = connect_db()
+    failed = False
+    for label, filters, sort, index in cases:
+        for after in (None, ('x', 1)):
+            query, params = members_query(MEMBER_COLUMNS, filters, sort, after, MAX_PAGE_SIZE)
+            plan = [row['detail'] for row in sql.execute('explain query plan ' + query, params)]
+            # Um 'SCAN members' sem índice é a tabela inteira sendo lida; 'USE TEMP B-TREE' é a ordenação
+            # feita depois de ler todas as linhas do filtro
+            ok = (any(index in detail for detail in plan) and not any(detail == 'SCAN members' for detail in plan)
+                  and not any('TEMP B-TREE' in detail for detail in plan))
+            failed = failed or not ok
+            click.echo('{} {}{}: {}'.format('ok  ' if ok else 'FAIL', label, ' (next page)' if after else '', ' | '.join(plan)))
+    sql.close()
+    if failed:
+        raise SystemExit(1)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,73 @@
+"""
+Benchmark: custo da autenticação por requisição.
+
+Compara a verificação de Basic Auth contra um hash de senha por cliente (o que cada chamada
+custaria sem tokens) com a verificação do token assinado usada pelo decorator protected.
+
+Uso (dentro da pasta member_api):
+    python bench_auth.py --iterations 2000
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from werkzeug.security import check_password_hash
+
+import database
+from common.migrate import upgrade_app
+from bench_pool import bench_headers, seed
+
+
+def per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6  # microssegundos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        database.db.path = os.path.join(tmp, 'members.db')
+        shutil.copy('members.db', database.db.path)
+
+        import app
+        upgrade_app(app.app)
+        seed(database.db.path, 100)
+        client = app.app.test_client()
+        headers = bench_headers(client)
+        token = headers['Authorization'].split(' ', 1)[1]
+
+        sql = sqlite3.connect(database.db.path)
+        sql.row_factory = sqlite3.Row
+
+        def basic_check():
+            client_row = sql.execute('select password from api_clients where name = ?', ['bench']).fetchone()
+            assert check_password_hash(client_row['password'], 'bench')
+
+        def token_check():
+            assert app.token_serializer.loads(token, max_age=app.TOKEN_TTL)['client'] == 'bench'
+
+        # O hash é propositalmente lento, então usa menos iterações para ele
+        basic = per_call(basic_check, max(args.iterations // 100, 10))
+        bearer = per_call(token_check, args.iterations)
+        sql.close()
+
+        request_us = per_call(lambda: client.get('/member/1', headers=headers), args.iterations)
+        database.db.close_pool()
+
+        print('Basic Auth + hash da senha: {:10.1f} us por requisição'.format(basic))
+        print('Token assinado (Bearer):    {:10.1f} us por requisição ({:.0f}x mais rápido)'.format(bearer, basic / bearer))
+        print('GET /member/1 completo com token: {:.1f} us'.format(request_us))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
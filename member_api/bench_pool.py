@@ -0,0 +1,91 @@
+"""
+Benchmark: requisições por segundo com o pool de conexões (common/database.py) contra o
+comportamento antigo, que abria e fechava uma conexão SQLite a cada requisição.
+
+Uso (dentro da pasta member_api):
+    python bench_pool.py --requests 5000 --members 10000
+
+O benchmark trabalha numa cópia temporária de members.db, o banco real não é alterado.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from werkzeug.security import generate_password_hash
+
+import database
+from common.migrate import upgrade_app
+
+
+def connect_per_request():
+    """
+    Comportamento anterior ao pool: uma conexão nova, sem PRAGMAs, por requisição.
+    """
+    sql = sqlite3.connect(database.db.path)
+    sql.row_factory = sqlite3.Row
+    return sql
+
+def seed(path, members):
+    sql = sqlite3.connect(path)
+    sql.execute('delete from members')
+    sql.execute("delete from sqlite_sequence where name = 'members'")  # ids voltam a começar em 1
+    sql.executemany('insert into members (name, email, level) values (?, ?, ?)',
+                    (('member{}'.format(i), 'member{}@example.com'.format(i), 'Bronze') for i in range(members)))
+    sql.commit()
+    sql.close()
+
+def bench_headers(client):
+    """
+    Cadastra um cliente da API no banco temporário e retorna o header com o token dele.
+    """
+    sql = sqlite3.connect(database.db.path)
+    sql.execute('insert or replace into api_clients (name, password) values (?, ?)', ['bench', generate_password_hash('bench')])
+    sql.commit()
+    sql.close()
+    token = client.post('/token', auth=('bench', 'bench')).json['access_token']
+    return {'Authorization': 'Bearer ' + token}
+
+def run(client, headers, requests, members):
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get('/member/{}'.format(i % members + 1), headers=headers)
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--members', type=int, default=10000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        database.db.path = os.path.join(tmp, 'members.db')
+        shutil.copy('members.db', database.db.path)
+        seed(database.db.path, args.members)
+
+        import app
+        upgrade_app(app.app)
+        client = app.app.test_client()
+        headers = bench_headers(client)
+
+        # get_db() usa database.db.acquire e o teardown usa app.release_db
+        pooled_acquire, pooled_release = database.db.acquire, app.release_db
+        database.db.acquire, app.release_db = connect_per_request, lambda sql: sql.close()
+        old = run(client, headers, args.requests, args.members)
+
+        database.db.acquire, app.release_db = pooled_acquire, pooled_release
+        new = run(client, headers, args.requests, args.members)
+        database.db.close_pool()
+
+        print('connect por requisição: {:8.0f} req/s'.format(old))
+        print('pool de conexões:       {:8.0f} req/s ({:.2f}x)'.format(new, new / old))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
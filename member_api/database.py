@@ -1,21 +1,17 @@
-from flask import g
-import sqlite3
+import os
+import sys
 
+# Os apps rodam de dentro da própria pasta: a raiz do repositório entra no sys.path para o pacote common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def connect_db():
-    """
-    Estabelece uma conexão com o banco de dados SQLite.
-    Configura a fábrica de linhas para retornar dicionários ao invés de tuplas.
-    """
-    sql = sqlite3.connect('members.db')
-    sql.row_factory = sqlite3.Row  # Retorna as linhas como dicionários ao invés de tuplas
-    return sql
+from common.database import Database
 
-def get_db():
-    """
-    Obtém a conexão com o banco de dados armazenada em g.
-    Se não existir, cria uma nova conexão e a armazena em g.
-    """
-    if not hasattr(g, 'sqlite_db'):  # Verifica se 'sqlite_db' não existe em 'g'
-        g.sqlite_db = connect_db()  # Conecta ao banco de dados e armazena a conexão em 'g'
-    return g.sqlite_db
\ No newline at end of file
+
+# Banco do app, com o pool de conexões de common/database.py. Os benchmarks trocam db.path
+# por uma cópia temporária antes de importar o app
+db = Database('members.db')
+
+get_db = db.get
+release_db = db.release
+init_db = db.init
+connect_db = db.connect
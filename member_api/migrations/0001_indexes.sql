@@ -0,0 +1,11 @@
+-- Índices usados pelas consultas do app. Ficam numa migração, aplicada uma vez por 'flask db upgrade' no deploy,
+-- e não no schema.sql, que roda a cada worker que sobe: criar um índice numa tabela grande segura o lock de escrita.
+-- IF NOT EXISTS: bancos em que o schema.sql antigo já criou algum desses índices só passam para a versão 1
+
+-- Limpeza das respostas antigas do Idempotency-Key
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_at ON idempotency_keys (created_at);
+
+-- Índices dos filtros e ordenações da listagem (GET /member?level=&email=&sort=)
+CREATE INDEX IF NOT EXISTS members_level ON members (level);
+CREATE INDEX IF NOT EXISTS members_email ON members (email);
+CREATE INDEX IF NOT EXISTS members_name ON members (name);
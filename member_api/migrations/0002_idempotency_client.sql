@@ -0,0 +1,16 @@
+-- idempotency_keys passa a ter a chave primária (client, key). As respostas guardadas na tabela antiga não dizem
+-- de qual cliente eram e só valem por IDEMPOTENCY_TTL, então são descartadas em vez de copiadas.
+-- Num banco novo o schema.sql já criou a tabela nova, que é só recriada (vazia)
+DROP TABLE IF EXISTS idempotency_keys;
+
+CREATE TABLE idempotency_keys (
+    client TEXT NOT NULL,
+    key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (client, key)
+);
+
+CREATE INDEX idempotency_keys_created_at ON idempotency_keys (created_at);
@@ -0,0 +1,5 @@
+-- Filtro + ordenação por nome (GET /member?level=&sort=name, ?email=&sort=-name...). Com só members_level ou
+-- members_email o SQLite acha as linhas pelo índice mas ordena todas numa B-tree temporária antes do limit.
+-- A entrada do índice termina no rowid, então (level, name) já entrega a ordem (name, id) do cursor
+CREATE INDEX IF NOT EXISTS members_level_name ON members (level, name);
+CREATE INDEX IF NOT EXISTS members_email_name ON members (email, name);
@@ -0,0 +1,57 @@
+from common.counters import CounterDatabase
+import os
+import time
+
+
+# Banco separado do members.db: o controle de taxa não pode disputar o lock de escrita
+# que ele está tentando proteger. Os workers do gunicorn na mesma máquina compartilham o arquivo.
+DATABASE = 'ratelimit.db'
+
+WRITE_RATE = float(os.environ.get('WRITE_RATE', 10))    # Tokens devolvidos ao balde por segundo
+WRITE_BURST = float(os.environ.get('WRITE_BURST', 20))  # Capacidade do balde (maior rajada permitida)
+
+CLEANUP_EVERY = 1000  # A cada quantas chamadas o processo apaga baldes que já estão cheios
+
+counters = CounterDatabase(DATABASE, 'create table if not exists buckets (key text primary key, tokens real not null, updated_at real not null)')
+get_db = counters.get
+
+_calls = 0
+
+
+def take_token(key, rate=None, burst=None):
+    """
+    Tenta tirar um token do balde de 'key'.
+    Retorna 0 se a requisição pode seguir, ou quantos segundos faltam para o próximo token.
+    """
+    global _calls
+    rate = rate or WRITE_RATE
+    burst = burst or WRITE_BURST
+    sql = get_db()
+    now = time.time()
+
+    sql.execute('begin immediate')
+    try:
+        bucket = sql.execute('select tokens, updated_at from buckets where key = ?', [key]).fetchone()
+        if bucket is None:
+            tokens = burst
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)  # Reabastece pelo tempo que passou
+
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0
+        else:
+            retry_after = (1 - tokens) / rate
+
+        sql.execute('insert or replace into buckets (key, tokens, updated_at) values (?, ?, ?)', [key, tokens, now])
+
+        _calls += 1
+        if _calls % CLEANUP_EVERY == 0:
+            # Um balde que já teria voltado a ficar cheio equivale a um balde inexistente
+            sql.execute('delete from buckets where updated_at < ?', [now - burst / rate])
+        sql.execute('commit')
+    except Exception:
+        sql.execute('rollback')
+        raise
+
+    return retry_after
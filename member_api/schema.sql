@@ -1,6 +1,73 @@
-CREATE TABLE members (
+CREATE TABLE IF NOT EXISTS members (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
     email TEXT NOT NULL,
     level TEXT NOT NULL
 );
+
+-- Respostas guardadas para o header Idempotency-Key do POST /member.
+-- A chave é de cada cliente: dois clientes podem usar o mesmo valor sem ver a resposta um do outro
+-- (bancos criados com a tabela antiga, só com key, são convertidos por migrations/0002_idempotency_client.sql)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    client TEXT NOT NULL,
+    key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (client, key)
+);
+
+-- Contador de versão da tabela members, usado nos ETags dos GETs.
+-- Os triggers incrementam a versão a cada escrita, qualquer que seja a rota que escreveu.
+CREATE TABLE IF NOT EXISTS data_version (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO data_version (name, version) VALUES ('members', 1);
+
+CREATE TRIGGER IF NOT EXISTS members_version_insert AFTER INSERT ON members
+BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'members';
+END;
+
+CREATE TRIGGER IF NOT EXISTS members_version_update AFTER UPDATE ON members
+BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'members';
+END;
+
+CREATE TRIGGER IF NOT EXISTS members_version_delete AFTER DELETE ON members
+BEGIN
+    UPDATE data_version SET version = version + 1 WHERE name = 'members';
+END;
+
+-- Clientes da API. A senha é guardada como hash e só é verificada em POST /token
+CREATE TABLE IF NOT EXISTS api_clients (
+    name TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+
+-- Log de alterações da tabela members para o GET /member/changes.
+-- Cada escrita gera uma linha com um seq crescente; exclusões ficam registradas como 'delete'.
+CREATE TABLE IF NOT EXISTS member_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    member_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS members_changes_insert AFTER INSERT ON members
+BEGIN
+    INSERT INTO member_changes (member_id, op, changed_at) VALUES (NEW.id, 'insert', (julianday('now') - 2440587.5) * 86400.0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS members_changes_update AFTER UPDATE ON members
+BEGIN
+    INSERT INTO member_changes (member_id, op, changed_at) VALUES (NEW.id, 'update', (julianday('now') - 2440587.5) * 86400.0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS members_changes_delete AFTER DELETE ON members
+BEGIN
+    INSERT INTO member_changes (member_id, op, changed_at) VALUES (OLD.id, 'delete', (julianday('now') - 2440587.5) * 86400.0);
+END;
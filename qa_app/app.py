@@ -1,43 +1,144 @@
-from flask import Flask, render_template, g, request, session, redirect, url_for
-from database import get_db
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, g, request, session, redirect, url_for, Response, abort
+from markupsafe import Markup, escape
+from database import get_db, release_db, init_db
+from common import assets, migrate
+from common.templates import init_template_cache
+from cache import LRUCache
+from events import broadcaster, record_event, CLOSED
+from passwords import hash_password, verify_password, HashingBusy
+import database
+import throttle
+import hashlib
+import math
 import os
+import queue
+import sys
+import time
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24) # Gera uma SECRET_KEY aleatória para a sessão
 
+init_template_cache(app)  # Bytecode dos templates compartilhado pelos workers e 'flask precompile-templates'
+
+# url_for('static') aponta para os arquivos com hash no nome gerados por 'flask build-static', servidos com cache de um ano e gzip
+assets.init_app(app)
+
+init_db('schema.sql')  # Cria as tabelas e triggers que ainda não existirem (os índices vêm das migrações)
+
+migrate.init_app(app, database.db.path)  # 'flask db upgrade' aplica as migrações da pasta migrations/
+
 @app.teardown_appcontext
 def close_db(error):
     """
-    Fecha a conexão com o banco de dados armazenada em g, se existir.
+    Devolve ao pool a conexão com o banco de dados armazenada em g, se existir.
     Esta função é chamada automaticamente ao final de cada requisição.
+    A conexão continua aberta para ser reaproveitada pela próxima requisição do worker.
     """
     if hasattr(g, 'sqlite_db'):  # Verifica se 'sqlite_db' existe em 'g'
-        g.sqlite_db.close()  # Fecha a conexão com o banco de dados
+        release_db(g.pop('sqlite_db'))  # Devolve a conexão ao pool
+
+USER_CACHE_SIZE = 1024  # Usuários logados mantidos no cache de cada worker
+USER_VERSION_CHECK = 1.0  # Segundos entre as checagens da versão de users no banco
+
+# Cache por worker: nome do usuário da session -> id, nome e flags de expert/admin
+user_cache = LRUCache(USER_CACHE_SIZE)
 
 def get_current_user():
     """
     Função para retornar as informações do usuário atual. É utilizada em cada route.
     Quando um usuário faz login, seu nome de usuário fica salvo na session.
-    Essa função verifica se há algum usuário na session, e busca suas informações no BD pelo nome.
-    Retorna uma linha do banco de dados em formato de dicionário.
+    Essa função verifica se há algum usuário na session, e busca suas informações no cache do worker
+    ou, se não estiverem lá, no BD pelo nome.
+    Retorna um dicionário com id, name, expert e admin (e pending, para experts).
     """
     user_result = None
     if 'user' in session: 
         user = session['user']
         db = get_db()
-        user_cur = db.execute('select * from users where name = ?', [user])
-        user_result = user_cur.fetchone()
+        # Qualquer alteração em users (ex.: promote em outro worker) muda a versão e esvazia o cache.
+        # A versão é conferida no máximo a cada USER_VERSION_CHECK segundos, então entre as checagens um usuário
+        # em cache não custa consulta nenhuma. Um promote ou rebaixamento feito em outro worker leva até
+        # USER_VERSION_CHECK segundos para valer neste; no worker que o fez vale na hora (invalidate_users)
+        now = time.monotonic()
+        if now - user_cache.checked_at >= USER_VERSION_CHECK:
+            user_cache.check_version(db.execute("select version from data_version where name = 'users'").fetchone()['version'])
+            user_cache.checked_at = now
+
+        user_result = user_cache.get(user)
+        if user_result is None:
+            user_cur = db.execute('select id, name, expert, admin from users where name = ?', [user])
+            user_row = user_cur.fetchone()
+            if user_row:
+                user_result = dict(user_row)
+                user_cache.set(user, user_result)
+
+        if user_result and user_result['expert'] == 1:
+            # Perguntas esperando resposta, para o contador do menu. Lido a cada requisição (muda a todo momento),
+            # mas é uma busca pela chave primária do contador mantido pelos triggers, sem COUNT(*)
+            pending_row = db.execute('select pending from expert_pending where expert_id = ?', [user_result['id']]).fetchone()
+            user_result = dict(user_result, pending=pending_row['pending'] if pending_row else 0)
 
     return user_result
 
+def invalidate_users():
+    """
+    Esvazia o cache de usuários deste worker e força a próxima requisição a consultar a versão no banco.
+    """
+    user_cache.clear()
+    user_cache.checked_at = 0
+
+FRAGMENT_CACHE_SIZE = 512 # Fragmentos HTML mantidos no cache de cada worker
+FRAGMENT_VERSION_CHECK = 1.0 # Segundos entre as checagens da versão das perguntas no banco
+
+# Cache por worker dos trechos de página que são iguais para todos os visitantes (lista da HOME).
+# O menu (show_links) depende do usuário e continua sendo renderizado a cada requisição
+fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE)
+
+def cached_fragment(key, render):
+    """
+    Retorna o fragmento HTML guardado em 'key' ou o renderiza com render() e guarda no cache.
+    ask() e answer() esvaziam o cache do próprio worker ao escrever. Os outros workers percebem a escrita
+    pela versão 'questions' da tabela data_version, consultada no máximo a cada FRAGMENT_VERSION_CHECK segundos,
+    então entre as checagens uma visita anônima não acessa o banco.
+    """
+    now = time.monotonic()
+    if now - fragment_cache.checked_at >= FRAGMENT_VERSION_CHECK:
+        fragment_cache.check_version(get_db().execute("select version from data_version where name = 'questions'").fetchone()['version'])
+        fragment_cache.checked_at = now
+
+    fragment = fragment_cache.get(key)
+    if fragment is None:
+        fragment = render()
+        fragment_cache.set(key, fragment)
+    return Markup(fragment)
+
+def invalidate_fragments():
+    """
+    Esvazia o cache de fragmentos deste worker e força a próxima requisição a consultar a versão no banco.
+    """
+    fragment_cache.clear()
+    fragment_cache.checked_at = 0
+
 # HOMEPAGE - Contém acessos para funcionalidades do app e exibe uma lista com as perguntas já respondidas
+QUESTIONS_PER_PAGE = 20 # Perguntas respondidas por página da HOME
+
 @app.route('/')
 def index():
     user = get_current_user() # Obtém as informações do usuário na session, os links do template variam de acordo com o tipo de usuário
+    before = request.args.get('before', type=int) # id da última pergunta da página anterior, para o link 'Older questions'
+    question_list = cached_fragment(('home', before), lambda: render_question_list(before))
+
+    return render_template('home.html', user=user, question_list=question_list) # Envia os dados do usuário e a lista de perguntas respondidas para o template
+
+def render_question_list(before):
+    """
+    Renderiza a lista de perguntas respondidas de uma página da HOME (sem o menu, que depende do usuário).
+    """
     db = get_db()
     # Query para obter apenas as perguntas já respondidas, nome do usuário que perguntou, e especialista que respondeu
+    # Mais novas primeiro, uma página por vez. O índice parcial questions_answered entrega as perguntas
+    # respondidas já em ordem, então o custo não depende de quantas perguntas existem
     question_cur = db.execute('''select 
                                     questions.id as question_id, 
                                     questions.question_text, 
@@ -45,10 +146,17 @@ def index():
                                     experts.name as expert_name 
                                 from questions join users as askers on askers.id = questions. asked_by_id 
                                                 join users as experts on experts.id = questions.expert_id 
-                                where questions.answer_text is not null''')
+                                where questions.answer_text is not null and questions.id < ?
+                                order by questions.id desc
+                                limit ?''', [before or sys.maxsize, QUESTIONS_PER_PAGE + 1]) # Uma a mais para saber se existe uma próxima página
     question_results = question_cur.fetchall()
 
-    return render_template('home.html', user=user, questions=question_results) # Envia os dados do usuário e perguntas respondidas para o template
+    older = None
+    if len(question_results) > QUESTIONS_PER_PAGE:
+        question_results = question_results[:QUESTIONS_PER_PAGE]
+        older = question_results[-1]['question_id']
+
+    return render_template('question_list.html', questions=question_results, older=older, paginated=before is not None)
 
 # REGISTER - Local para o usuário se cadastrar, apenas nome e senha. Todo usuário cadastrado aqui não é admin e nem expert
 # Um admin deve ser definido manualmente no BD e após isso ele pode promover um usário comum a expert diretamente na aplicação
@@ -67,7 +175,11 @@ def register():
             return render_template('register.html', user=user, error='User already exists!')
         
         # Gera um HASH para a senha digitada pelo usuário e atribui à variável HASH 
-        hashed_password = generate_password_hash(request.form['password'])
+        # O hash roda no pool de processos (passwords.py); com a fila cheia a página responde na hora com erro
+        try:
+            hashed_password = hash_password(request.form['password'])
+        except HashingBusy:
+            return render_template('register.html', user=user, error='Server busy, please try again.'), 503
         expert = 0 # EXPERT = False
         admin = 0 # ADMIN = False
         #Cadastra as informações no banco de dados
@@ -92,6 +204,12 @@ def login():
         # Dados digitados pelo usuário
         name = request.form['name']
         password = request.form['password']
+
+        # Usuário ou IP bloqueado por excesso de falhas: recusa antes de buscar o usuário e de calcular qualquer hash
+        wait = throttle.locked_for(name, request.remote_addr)
+        if wait:
+            error = 'Too many failed attempts. Try again in {} seconds.'.format(math.ceil(wait))
+            return render_template('login.html', user=user, error=error), 429, {'Retry-After': str(math.ceil(wait))}
         
         # Faz a busca pelo nome do usuário
         user_cur = db.execute('select id, name, password from users where name = ?', [name])
@@ -99,24 +217,121 @@ def login():
 
         # Se o usuário existir, confere as senhas, caso contrário recarrega a página com mensagem de erro
         if user_result:
-            # Confere se o hash da senha digitada bate com o hash da senha no banco de dados
-            if check_password_hash(user_result['password'], password):
+            # Confere se o hash da senha digitada bate com o hash da senha no banco de dados (no pool de processos)
+            try:
+                password_ok, new_hash = verify_password(user_result['password'], password)
+            except HashingBusy:
+                return render_template('login.html', user=user, error='Server busy, please try again.'), 503
+
+            if password_ok:
+                if new_hash: # O hash guardado usa parâmetros antigos, troca pelo hash com os parâmetros atuais
+                    db.execute('update users set password = ? where id = ?', [new_hash, user_result['id']])
+                    db.commit()
+                throttle.reset(name)
                 session['user'] = user_result['name'] # Inicia a session no login
                 return redirect(url_for('index')) # Redireciona para a HOME
             else: # Se a senha não confere, exibe mensagem de erro
+                throttle.record_failure(name, request.remote_addr)
                 error = 'The password is incorrect'
                 return render_template('login.html', user=user, error=error)
             
+        throttle.record_failure(name, request.remote_addr) # Nome inexistente também conta, senão daria para testar nomes à vontade
         error = 'The username is incorrect'        
 
     return render_template('login.html', user=user, error=error)
 
 # QUESTION - o único acesso a esta página é através da lista de perguntas respondidas na HOME, qualquer pessoa pode ter acesso à esta página, esteja logado ou não
-@app.route('/question/<question_id>') # a route necessita do id da pergunta, quando clicada na HOME
+QUESTION_MAX_AGE = 5 * 60 # Segundos que o navegador de um visitante anônimo reusa a página de uma pergunta respondida sem perguntar ao servidor
+ANSWERED_CACHE_SIZE = 1024 # Perguntas respondidas mantidas no cache de cada worker
+ANSWERS_VERSION_CHECK = 1.0 # Segundos entre as checagens da versão das respostas no banco
+
+# Cache por worker das perguntas respondidas: ('body', id) -> conteúdo da pergunta, ('page', id) -> página inteira
+# para visitantes anônimos. Um expert pode responder de novo: answer() tira a pergunta do cache do próprio worker,
+# e os outros percebem pela versão 'answers' da tabela data_version (answers_version)
+answered_cache = LRUCache(ANSWERED_CACHE_SIZE)
+
+def answers_version():
+    """
+    Versão 'answers' da tabela data_version, que muda a cada resposta gravada em qualquer worker.
+    Consultada no máximo a cada ANSWERS_VERSION_CHECK segundos; quando muda, esvazia o answered_cache deste worker.
+    """
+    now = time.monotonic()
+    if now - answered_cache.checked_at >= ANSWERS_VERSION_CHECK:
+        answered_cache.check_version(get_db().execute("select version from data_version where name = 'answers'").fetchone()['version'])
+        answered_cache.checked_at = now
+    return answered_cache.version
+
+def invalidate_question(question_id):
+    """
+    Tira a pergunta do answered_cache deste worker e força a próxima requisição a consultar a versão no banco,
+    para o ETag mudar na hora.
+    """
+    answered_cache.pop(('body', question_id))
+    answered_cache.pop(('page', question_id))
+    answered_cache.checked_at = 0
+
+# Muda quando algum template muda (deploy), para os navegadores não reusarem páginas com o layout antigo.
+# Igual em todos os workers da máquina, então um ETag gerado por um worker vale nos outros
+TEMPLATES_VERSION = str(max(int(os.path.getmtime(os.path.join(app.root_path, 'templates', name)))
+                            for name in os.listdir(os.path.join(app.root_path, 'templates'))))
+
+def question_etag(question_id, user):
+    """
+    ETag da página de uma pergunta respondida. O menu varia com o usuário (tipo, contador de pendentes),
+    então ele entra no ETag junto com o id da pergunta, a versão das respostas (muda se a pergunta for
+    respondida de novo), a dos templates e a dos arquivos de static/ (a página traz os nomes com hash do CSS).
+    """
+    who = 'anonymous'
+    if user:
+        who = '{}:{}:{}:{}'.format(user['id'], user['expert'], user['admin'], user.get('pending'))
+    return hashlib.sha1('{}:{}:{}:{}:{}'.format(question_id, answers_version(), TEMPLATES_VERSION, assets.version(app), who).encode()).hexdigest()
+
+def question_headers(etag, user):
+    """
+    Visitante anônimo: qualquer cache pode guardar a página por QUESTION_MAX_AGE segundos.
+    Usuário logado: só o navegador dele guarda, e confere o ETag a cada visita.
+    Vary: Cookie impede que a página anônima guardada seja mostrada depois do login.
+    """
+    cache_control = 'public, max-age={}'.format(QUESTION_MAX_AGE) if user is None else 'private, no-cache'
+    return {'ETag': '"{}"'.format(etag), 'Cache-Control': cache_control, 'Vary': 'Cookie'}
+
+@app.route('/question/<int:question_id>') # a route necessita do id da pergunta, quando clicada na HOME
 def question(question_id):
     user = get_current_user()
+
+    # Só páginas de perguntas respondidas recebem ETag, e ele muda quando alguma resposta muda: se o navegador
+    # já tem esta versão, responde 304 sem buscar a pergunta nem renderizar nada (entre as checagens da versão,
+    # visitante anônimo não acessa o banco)
+    etag = question_etag(question_id, user)
+    if request.if_none_match.contains(etag):
+        return '', 304, question_headers(etag, user)
+
+    if user is None:
+        page = answered_cache.get(('page', question_id))
+        if page is not None:
+            return page, question_headers(etag, user)
+
+    question_body = answered_cache.get(('body', question_id))
+    if question_body is None:
+        question = load_question(question_id)
+        if question is None:
+            abort(404)
+        question_body = Markup(render_template('question_body.html', question=question))
+        if question['answer_text'] is None:
+            # Ainda sem resposta: a página vai mudar, então não vai para nenhum cache
+            return render_template('question.html', user=user, question_body=question_body), {'Cache-Control': 'no-cache'}
+        answered_cache.set(('body', question_id), question_body)
+
+    page = render_template('question.html', user=user, question_body=question_body)
+    if user is None:
+        answered_cache.set(('page', question_id), page)
+    return page, question_headers(etag, user)
+
+def load_question(question_id):
+    """
+    Busca a pergunta, quem perguntou e o expert numa única consulta pela chave primária de questions.
+    """
     db = get_db()
-    # Query das informações da pergunta selecionada pelo id 
     question_cur = db.execute('''
                                 select 
                                     questions.id as question_id,
@@ -124,13 +339,62 @@ def question(question_id):
                                     questions.question_text, 
                                     askers.name as asker_name, 
                                     experts.name as expert_name 
-                                from questions join users as askers on askers.id = questions. asked_by_id 
+                                from questions join users as askers on askers.id = questions.asked_by_id 
                                                 join users as experts on experts.id = questions.expert_id 
-                                where question_id = ?''', [question_id])
+                                where questions.id = ?''', [question_id])
 
-    question = question_cur.fetchone()
+    return question_cur.fetchone()
 
-    return render_template('question.html', user=user, question=question)
+# SEARCH - Busca textual nas perguntas respondidas, qualquer pessoa pode usar. Resultados ordenados por relevância (bm25)
+SEARCH_MAX_PAGES = 50 # Páginas de resultado acessíveis, cada uma com QUESTIONS_PER_PAGE perguntas
+
+def fts_query(text):
+    """
+    Converte o texto digitado em uma consulta FTS5 segura: cada palavra vira um termo entre aspas,
+    assim caracteres como - * " ( não são interpretados como operadores. Todas as palavras precisam aparecer.
+    """
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+def highlight(snippet):
+    """
+    Escapa o trecho retornado pelo snippet() do FTS5 e troca os marcadores \x02 e \x03 pelas tags <mark>.
+    """
+    return Markup(str(escape(snippet)).replace('\x02', '<mark>').replace('\x03', '</mark>'))
+
+@app.route('/search')
+def search():
+    user = get_current_user()
+    q = request.args.get('q', '').strip() # Texto digitado pelo usuário
+    page = min(max(request.args.get('page', 1, type=int), 1), SEARCH_MAX_PAGES)
+
+    results = []
+    has_next = False
+    if q:
+        db = get_db()
+        # questions_fts é mantida pelos triggers do schema.sql. snippet() devolve o trecho com as palavras encontradas entre \x02 e \x03
+        search_cur = db.execute('''select
+                                    questions.id as question_id,
+                                    snippet(questions_fts, 0, char(2), char(3), '…', 16) as question_snippet,
+                                    snippet(questions_fts, 1, char(2), char(3), '…', 24) as answer_snippet,
+                                    askers.name as asker_name,
+                                    experts.name as expert_name
+                                from questions_fts join questions on questions.id = questions_fts.rowid
+                                                join users as askers on askers.id = questions.asked_by_id
+                                                join users as experts on experts.id = questions.expert_id
+                                where questions_fts match ? and questions.answer_text is not null
+                                order by bm25(questions_fts)
+                                limit ? offset ?''', [fts_query(q), QUESTIONS_PER_PAGE + 1, (page - 1) * QUESTIONS_PER_PAGE])
+        rows = search_cur.fetchall()
+
+        has_next = len(rows) > QUESTIONS_PER_PAGE and page < SEARCH_MAX_PAGES
+        for row in rows[:QUESTIONS_PER_PAGE]:
+            results.append({'question_id': row['question_id'],
+                            'question_text': highlight(row['question_snippet']),
+                            'answer_text': highlight(row['answer_snippet']),
+                            'asker_name': row['asker_name'],
+                            'expert_name': row['expert_name']})
+
+    return render_template('search.html', user=user, q=q, results=results, page=page, has_next=has_next)
 
 # ANSWER - Exibe uma pergunta e espaço para inserir resposta. O único tipo de usuário que tem acesso à essa página é o expert
 @app.route('/answer/<question_id>', methods=['GET', 'POST']) # A única maneira de acessar essa página é através da página de perguntas não respondidas, após uma pergunta for clicada
@@ -148,8 +412,18 @@ def answer(question_id):
 
     if request.method == 'POST':
         answer = request.form['answer'] # Resposta digitada no form
-        db.execute('update questions set answer_text = ? where id = ?', [answer, question_id]) # atualiza a pergunta no BD com a resposta
+        # Atualiza a pergunta no BD com a resposta (o expert pode corrigir uma resposta já dada)
+        db.execute('update questions set answer_text = ? where id = ?', [answer, question_id])
+        # Avisa quem perguntou (SSE), na mesma transação da resposta
+        asked_cur = db.execute('select id, question_text, asked_by_id from questions where id = ?', [question_id])
+        asked = asked_cur.fetchone()
+        if asked:
+            record_event(db, asked['asked_by_id'], 'question_answered', question_id=asked['id'], question_text=asked['question_text'], expert_name=user['name'])
         db.commit()
+        invalidate_fragments() # A HOME mudou
+        if asked:
+            invalidate_question(asked['id']) # A página da pergunta também (os outros workers veem a versão nova)
+        broadcaster.wake()
 
         return redirect(url_for('unanswered'))
 
@@ -171,8 +445,12 @@ def ask():
     if request.method == 'POST':
         question = request.form['question']
         expert = request.form['expert'] # expert escolhido a partir de um dropdown list
-        db.execute('insert into questions (question_text, asked_by_id, expert_id) values (?, ?, ?)',[question, user['id'], expert])
+        question_cur = db.execute('insert into questions (question_text, asked_by_id, expert_id) values (?, ?, ?)',[question, user['id'], expert])
+        # Avisa o expert escolhido (SSE), na mesma transação da pergunta
+        record_event(db, int(expert), 'question_asked', question_id=question_cur.lastrowid, question_text=question, asker_name=user['name'])
         db.commit()
+        invalidate_fragments()
+        broadcaster.wake()
         return redirect(url_for('index'))
         
     # QUERY para obter o id e nome dos experts cadastrados
@@ -182,6 +460,41 @@ def ask():
 
     return render_template('ask.html', user=user, experts=expert_results)
 
+# EVENTS - Stream de Server-Sent Events do usuário logado: 'question_asked' para o expert e 'question_answered' para quem perguntou
+# Cada conexão fica aberta, então rode o gunicorn com threads (ex.: gunicorn -k gthread --threads 100 app:app)
+SSE_HEARTBEAT = 15 # Segundos entre os comentários de keep-alive, que também detectam clientes que foram embora
+
+@app.route('/events')
+def events():
+    user = get_current_user()
+    if not user:
+        return '', 401
+
+    user_id = user['id']
+    subscription = broadcaster.subscribe(user_id)
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = subscription.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is CLOSED: # O cliente ficou para trás e foi descartado; o navegador reconecta
+                    return
+                kind, data = event
+                yield 'event: {}\ndata: {}\n\n'.format(kind, data)
+        finally:
+            broadcaster.unsubscribe(user_id, subscription)
+
+    # O stream não usa o contexto da requisição: a conexão com o banco volta ao pool assim que a rota retorna
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Desliga o buffer de proxies como o nginx
+    return response
+
 # UNANSWERED - Página com listas de perguntas não respondidas, somente o expert tem acesso
 @app.route('/unanswered')
 def unanswered():
@@ -207,7 +520,16 @@ def unanswered():
     return render_template('unanswered.html', user=user, questions=question_results)
 
 # USERS - Página para promover um usário comum para expert, apenas o ADMIN tem acesso
-# Ela apenas exibe uma lista dos usuários
+# Exibe os usuários em páginas, em ordem de nome, com filtro por início do nome e por tipo
+USERS_PER_PAGE = 50 # Usuários por página da lista do admin
+
+# Filtros por tipo de usuário. Cada um é atendido por um índice já em ordem de nome (users_expert_name, users_admin_name)
+USER_ROLES = {
+    'expert': 'expert = 1',
+    'user': 'expert = 0 and admin = 0',
+    'admin': 'admin = 1',
+}
+
 @app.route('/users')
 def users ():
     user = get_current_user()
@@ -218,18 +540,36 @@ def users ():
     # Se o usuário na session não for admin, redireciona para home
     if user['admin'] == 0:
         return redirect(url_for('index'))
-    
-    db = get_db()
-    # Query que seleciona tudo de todos os usuários
 
-    users_cur = db.execute('select * from users')
+    prefix = request.args.get('prefix', '') # Início do nome
+    role = request.args.get('role', '')
+    if role not in USER_ROLES:
+        role = ''
+    after = request.args.get('after', '') # Nome do último usuário da página anterior, para o link 'Next'
+
+    # Intervalo de nomes que começam com prefix: usa o índice em vez de comparar todos os nomes, como faria um LIKE
+    conditions = ['name >= ?', 'name < ?', 'name > ?']
+    params = [prefix, prefix + '\U0010ffff', after]
+    if role:
+        conditions.append(USER_ROLES[role])
+
+    db = get_db()
+    # Só as colunas usadas pela página (o hash da senha fica no banco), uma página por vez
+    users_cur = db.execute('select id, name, expert, admin from users where {} order by name limit ?'.format(' and '.join(conditions)),
+                           params + [USERS_PER_PAGE + 1]) # Um a mais para saber se existe uma próxima página
     user_results = users_cur.fetchall()
 
-    return render_template('users.html', user=user, users=user_results)
+    next_after = None
+    if len(user_results) > USERS_PER_PAGE:
+        user_results = user_results[:USERS_PER_PAGE]
+        next_after = user_results[-1]['name']
 
-#PROMOTE - Não tem template, é uma ação da página USERS. Atualiza o tipo de um usuário 
-@app.route('/promote/<user_id>') # Depende de um id de usuário
-def promote(user_id):
+    return render_template('users.html', user=user, users=user_results, prefix=prefix, role=role, roles=USER_ROLES,
+                           after=after, next_after=next_after)
+
+#PROMOTE - Não tem template, é uma ação da página USERS. Promove ou rebaixa de uma vez os usuários marcados na página
+@app.route('/promote', methods=['POST'])
+def promote():
     user = get_current_user()
     # Se não houver usuário na session, redireciona para login
     if not user:
@@ -237,11 +577,18 @@ def promote(user_id):
     # Se o usuário na session não for admin, redireciona para home
     if user['admin'] == 0:
         return redirect(url_for('index'))
-    
+
+    expert = 1 if request.form.get('action') == 'promote' else 0
+    user_ids = request.form.getlist('user_id', type=int)[:USERS_PER_PAGE]
+
     db = get_db()
-    db.execute('update users set expert = 1 where id = ?', [user_id])
-    db.commit()
-    return redirect(url_for('users'))
+    # Todos os usuários na mesma transação. Quem já tem o tipo pedido não é atualizado, e não muda a versão de users à toa
+    db.executemany('update users set expert = ? where id = ? and expert != ?', [(expert, user_id, expert) for user_id in user_ids])
+    db.commit() # O trigger de users muda a versão, que invalida o cache de usuários dos outros workers
+    invalidate_users()
+    # Volta para a mesma página da lista, com os mesmos filtros
+    return redirect(url_for('users', prefix=request.form.get('prefix') or None, role=request.form.get('role') or None,
+                            after=request.form.get('after') or None))
 
 # Rota para deslogar o usuário, apenas remove o user da session
 @app.route('/logout')
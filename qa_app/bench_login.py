@@ -0,0 +1,89 @@
+"""
+Benchmark: logins por segundo e latência das outras páginas enquanto há uma rajada de logins.
+
+Compara o hash da senha rodando dentro do worker (como era antes) com o pool de processos de
+passwords.py. --login-threads threads fazem login sem parar enquanto --page-threads threads
+pedem a HOME, durante --seconds segundos. Trabalha numa cópia temporária de questions.db.
+
+Uso (dentro da pasta qa_app):
+    python bench_login.py --login-threads 8 --page-threads 4 --seconds 10
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from werkzeug.security import check_password_hash
+
+import database
+from common.migrate import upgrade_app
+import passwords
+
+
+def inline_verify(stored_hash, password):
+    """
+    Comportamento anterior ao pool: o hash roda na thread da requisição.
+    """
+    return check_password_hash(stored_hash, password), None
+
+def run(app, login_threads, page_threads, seconds):
+    stop = time.monotonic() + seconds
+    logins = []
+    busy = []
+    page_times = []
+
+    def login_loop():
+        client = app.app.test_client()
+        while time.monotonic() < stop:
+            response = client.post('/login', data={'name': 'admin', 'password': 'adminpass'})
+            (logins if response.status_code == 302 else busy).append(1)
+
+    def page_loop():
+        client = app.app.test_client()
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            client.get('/')
+            page_times.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(login_threads)]
+    threads += [threading.Thread(target=page_loop) for _ in range(page_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    page_times.sort()
+    return (len(logins) / seconds, len(busy), statistics.median(page_times),
+            page_times[int(len(page_times) * 0.95)], len(page_times) / seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--page-threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        database.db.path = os.path.join(tmp, 'questions.db')
+        shutil.copy('questions.db', database.db.path)
+
+        import app
+        upgrade_app(app.app)
+        passwords.hash_password('warm-up')  # Sobe os processos do pool antes de medir
+
+        print('{:<8} {:>10} {:>10} {:>12} {:>12} {:>10}'.format('modo', 'logins/s', 'recusados', 'HOME p50', 'HOME p95', 'HOME/s'))
+        for mode, verify in (('inline', inline_verify), ('pool', passwords.verify_password)):
+            app.verify_password = verify
+            result = run(app, args.login_threads, args.page_threads, args.seconds)
+            print('{:<8} {:>10.1f} {:>10} {:>9.1f} ms {:>9.1f} ms {:>10.1f}'.format(mode, *result))
+        database.db.close_pool()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
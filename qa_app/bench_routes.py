@@ -0,0 +1,108 @@
+"""
+Benchmark: tempo médio por rota do qa_app com um usuário logado.
+
+Mede numa cópia temporária de questions.db, com --users usuários e --questions perguntas a mais,
+três situações: o banco original (users.name sem índice e sem cache de usuários), só o índice
+users_name e o índice com o cache de usuários. Além das rotas, mede get_current_user() sozinha,
+onde fica a diferença do cache (nas rotas ela se mistura com o resto da requisição).
+Cada medida é a melhor de --repeat rodadas, para tirar o ruído da máquina.
+
+Uso (dentro da pasta qa_app):
+    python bench_routes.py --users 100000 --questions 10000 --requests 500
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import database
+from common.migrate import upgrade_app
+
+
+ROUTES = ['/', '/question/1', '/ask', '/unanswered']
+
+
+def seed(path, users, questions):
+    sql = sqlite3.connect(path)
+    first_user = sql.execute('select max(id) from users').fetchone()[0] + 1
+    sql.executemany('insert into users (name, password, expert, admin) values (?, ?, ?, ?)',
+                    (('user{}'.format(i), 'x', i % 10 == 0, 0) for i in range(users)))
+    sql.executemany('insert into questions (question_text, answer_text, asked_by_id, expert_id) values (?, ?, ?, ?)',
+                    (('Question {}?'.format(i), 'Answer {}'.format(i) if i % 2 else None, first_user + i % users, 3)
+                     for i in range(questions)))
+    sql.commit()
+    sql.close()
+
+def best_of(repeat, measure):
+    return min(measure() for _ in range(repeat))
+
+def run(client, route, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(route)
+        assert response.status_code == 200, (route, response.status_code)
+    return (time.perf_counter() - start) / requests * 1000  # milissegundos
+
+def run_current_user(app, requests):
+    with app.app.test_request_context():
+        app.session['user'] = 'expert'
+        start = time.perf_counter()
+        for _ in range(requests):
+            app.get_current_user()
+        elapsed = time.perf_counter() - start
+    return elapsed / requests * 1000000  # microssegundos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        database.db.path = os.path.join(tmp, 'questions.db')
+        shutil.copy('questions.db', database.db.path)
+
+        import app
+        upgrade_app(app.app)
+        seed(database.db.path, args.users, args.questions)
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['user'] = 'expert'  # Expert cadastrado no questions.db, acessa todas as rotas acima
+
+        cached_get = app.user_cache.get
+        sql = sqlite3.connect(database.db.path)
+        index_sql = sql.execute("select sql from sqlite_master where name = 'users_name'").fetchone()[0]
+
+        def configure(index, cache):
+            has_index = sql.execute("select 1 from sqlite_master where name = 'users_name'").fetchone() is not None
+            if index and not has_index:
+                sql.execute(index_sql)
+            elif has_index and not index:
+                sql.execute('drop index users_name')
+            app.user_cache.get = cached_get if cache else (lambda key, default=None: default)
+            app.user_cache.clear()
+
+        setups = [('sem índice', False, False), ('índice', True, False), ('índice + cache', True, True)]
+        results = {}
+        for label, index, cache in setups:
+            configure(index, cache)
+            results[label] = [best_of(args.repeat, lambda: run(client, route, args.requests)) for route in ROUTES]
+            results[label].append(best_of(args.repeat, lambda: run_current_user(app, args.requests)))
+        sql.close()
+
+        print('{:<22}'.format('rota') + ''.join('{:>18}'.format(label) for label, index, cache in setups))
+        for row, route in enumerate(ROUTES + ['get_current_user()']):
+            unit = 'us' if route == 'get_current_user()' else 'ms'
+            print('{:<22}'.format(route) + ''.join('{:>15.3f} {}'.format(results[label][row], unit) for label, index, cache in setups))
+        database.db.close_pool()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: tempo da rota /search com muitas perguntas indexadas no FTS5.
+
+Cria uma cópia temporária de questions.db com --questions perguntas respondidas de texto
+aleatório e mede o tempo médio de cada busca, renderização incluída.
+
+Uso (dentro da pasta qa_app):
+    python bench_search.py --questions 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import database
+from common.migrate import upgrade_app
+
+
+# Vocabulário com distribuição de Zipf, como um texto real: poucas palavras muito comuns e muitas raras.
+# Buscar uma palavra que aparece em quase todas as perguntas (w0, w1...) custa bem mais, porque o bm25
+# precisa pontuar todas elas; palavras mais raras ficam em poucos milissegundos
+WORDS = ['w{}'.format(i) for i in range(20000)]
+WEIGHTS = [1 / (i + 1) for i in range(len(WORDS))]
+
+SEARCHES = ['w5', 'w50', 'w500', 'w5000', 'w10 w100', 'w200 w2000']
+
+
+def sentence(words):
+    return ' '.join(random.choices(WORDS, WEIGHTS, k=words))
+
+def seed(path, questions):
+    sql = sqlite3.connect(path)
+    sql.executemany('insert into questions (question_text, answer_text, asked_by_id, expert_id) values (?, ?, 2, 3)',
+                    ((sentence(8) + '?', sentence(40)) for _ in range(questions)))
+    sql.commit()
+    sql.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=20, help='repetições de cada busca')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        database.db.path = os.path.join(tmp, 'questions.db')
+        shutil.copy('questions.db', database.db.path)
+
+        import app
+        upgrade_app(app.app)
+        start = time.perf_counter()
+        seed(database.db.path, args.questions)
+        print('{} perguntas inseridas e indexadas em {:.1f}s'.format(args.questions, time.perf_counter() - start))
+
+        client = app.app.test_client()
+        for q in SEARCHES:
+            for page in (1, 5):
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    assert client.get('/search', query_string={'q': q, 'page': page}).status_code == 200
+                print('{:<26} página {}: {:8.2f} ms'.format(q, page, (time.perf_counter() - start) / args.requests * 1000))
+        database.db.close_pool()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
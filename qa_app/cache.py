@@ -0,0 +1,46 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    """
+    Cache LRU simples, por processo (cada worker do gunicorn tem o seu).
+    Quando passa de maxsize itens, descarta o usado há mais tempo.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.version = None  # Versão dos dados (tabela data_version) que o conteúdo do cache reflete
+        self.checked_at = 0  # Quando a versão foi conferida pela última vez (time.monotonic)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def check_version(self, version):
+        """
+        Esvazia o cache se os dados mudaram desde que ele foi preenchido.
+        """
+        if version != self.version:
+            self.clear()
+            self.version = version
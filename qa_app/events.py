@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import database
+
+
+# Segundos entre as leituras da tabela events. A thread começa na primeira inscrição do worker e depois
+# continua lendo mesmo sem ninguém conectado (uma busca pela chave primária por intervalo)
+POLL_INTERVAL = 1.0
+EVENTS_TTL = 10 * 60  # Segundos que um evento fica na tabela antes de ser apagado
+MAX_QUEUE = 100  # Eventos pendentes por conexão; um cliente que não lê mais que isso é desconectado
+
+CLOSED = None  # Colocado na fila de uma conexão descartada: o stream dela termina ao recebê-lo
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """
+    Distribui eventos para as conexões SSE abertas neste worker, por id de usuário.
+
+    Os eventos são gravados na tabela events pelas rotas que escrevem (ask, answer). Uma única thread
+    por worker lê as linhas novas dessa tabela e entrega a quem estiver inscrito, então eventos gravados
+    por outros workers também chegam. A consulta custa o mesmo com 1 ou 1000 conexões abertas, e a thread
+    só é criada quando a primeira conexão se inscreve. wake() faz a thread ler na hora, sem esperar o intervalo.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set de filas, uma por conexão
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._last_seq = None
+
+    def subscribe(self, user_id):
+        events = queue.Queue(maxsize=MAX_QUEUE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(events)
+            self._start()
+        return events
+
+    def unsubscribe(self, user_id, events):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.discard(events)
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _start(self):
+        # Depois de um fork (workers do gunicorn) a thread do processo pai não existe mais
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='sse-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                self._close(user_id, events)
+
+    def _close(self, user_id, events):
+        """
+        Descarta uma conexão que parou de ler: esvazia a fila e coloca CLOSED, para o stream terminar
+        (o navegador reconecta sozinho). Só esta thread coloca itens na fila, então depois de esvaziá-la sempre há espaço.
+        """
+        self.unsubscribe(user_id, events)
+        while True:
+            try:
+                events.get_nowait()
+            except queue.Empty:
+                break
+        events.put_nowait(CLOSED)
+
+    def _run(self):
+        sql = database.connect_db()
+        last_cleanup = 0
+        if self._last_seq is None:
+            self._last_seq = sql.execute('select coalesce(max(seq), 0) from events').fetchone()[0]
+        while True:
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+            # Um erro (ex.: 'database is locked' na limpeza) não pode matar a thread: ela é a única do worker,
+            # e todas as conexões abertas ficariam sem eventos. Tenta de novo no próximo intervalo
+            try:
+                self._poll(sql)
+                if time.time() - last_cleanup > EVENTS_TTL:
+                    sql.execute('delete from events where created_at < ?', [time.time() - EVENTS_TTL])
+                    sql.commit()
+                    last_cleanup = time.time()
+            except sqlite3.Error:
+                logger.exception('SSE broadcaster failed to read or clean up events')
+                if sql.in_transaction:
+                    sql.rollback()
+
+    def _poll(self, sql):
+        # Uma busca pela chave primária por intervalo, para o worker inteiro
+        rows = sql.execute('select seq, user_id, kind, data from events where seq > ? order by seq', [self._last_seq]).fetchall()
+        for row in rows:
+            self._last_seq = row['seq']
+            self._publish(row['user_id'], (row['kind'], row['data']))
+
+
+broadcaster = Broadcaster()
+
+
+def record_event(db, user_id, kind, **data):
+    """
+    Grava um evento para user_id na conexão db. Deve ser chamada antes do commit da escrita que gerou
+    o evento, assim os dois entram juntos no banco. Depois do commit chame broadcaster.wake().
+    """
+    db.execute('insert into events (user_id, kind, data, created_at) values (?, ?, ?, ?)',
+               [user_id, kind, json.dumps(data), time.time()])
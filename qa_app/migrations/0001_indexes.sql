@@ -0,0 +1,20 @@
+-- Índices usados pelas consultas do app. Ficam numa migração, aplicada uma vez por 'flask db upgrade' no deploy,
+-- e não no schema.sql, que roda a cada worker que sobe: criar um índice numa tabela grande segura o lock de escrita.
+-- IF NOT EXISTS: bancos em que o schema.sql antigo já criou algum desses índices só passam para a versão 1
+
+-- Busca do usuário logado, login e cadastro são todos por nome
+CREATE UNIQUE INDEX IF NOT EXISTS users_name ON users (name);
+
+-- Lista de usuários do admin filtrada por tipo, em ordem de nome, e lista de experts da página ASK.
+-- Com o id (rowid) dentro do índice, essas consultas não precisam ler a tabela
+CREATE INDEX IF NOT EXISTS users_expert_name ON users (expert, name);
+
+-- Poucos admins: o filtro por admin lê só eles, já em ordem de nome
+CREATE INDEX IF NOT EXISTS users_admin_name ON users (name) WHERE admin = 1;
+
+-- Perguntas respondidas da HOME, da mais nova para a mais antiga.
+-- Parcial: só contém as respondidas, já em ordem de id. As linhas da página são lidas pelo rowid
+CREATE INDEX IF NOT EXISTS questions_answered ON questions (id) WHERE answer_text IS NOT NULL;
+
+-- Caixa de entrada do expert (/unanswered): só as perguntas sem resposta, agrupadas por expert
+CREATE INDEX IF NOT EXISTS questions_unanswered ON questions (expert_id) WHERE answer_text IS NULL;
@@ -0,0 +1,12 @@
+-- Preenchimento das tabelas derivadas de questions, que antes rodava no schema.sql a cada worker que subia:
+-- com muitas perguntas, o rebuild do FTS e o GROUP BY seguravam o lock de escrita na subida de cada worker.
+-- Os triggers do schema.sql já mantêm as duas tabelas a partir do import do app, então aqui tudo é
+-- recalculado do zero, na mesma transação, sem depender do que os triggers já gravaram
+
+-- Índice da busca textual com todas as perguntas
+INSERT INTO questions_fts (questions_fts) VALUES ('rebuild');
+
+-- Perguntas esperando resposta por expert
+DELETE FROM expert_pending;
+INSERT INTO expert_pending (expert_id, pending)
+	SELECT expert_id, count(*) FROM questions WHERE answer_text IS NULL GROUP BY expert_id;
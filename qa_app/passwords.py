@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+import multiprocessing
+import os
+import threading
+
+
+# Parâmetros dos hashes novos (formato do Werkzeug). Hashes guardados com outros parâmetros
+# são refeitos com estes no próximo login que der certo
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # Processos de hash por worker do gunicorn
+MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 8))  # Hashes na fila + em andamento antes de recusar
+HASH_TIMEOUT = 10  # Segundos de espera por um resultado
+
+
+class HashingBusy(Exception):
+    """
+    A fila de hashes está cheia. A rota deve responder na hora (ex.: 503) em vez de esperar.
+    """
+
+
+_executor = None
+_executor_pid = None
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_lock = threading.Lock()
+
+
+def _get_executor():
+    """
+    Cria o pool de processos na primeira chamada de cada worker. Usa 'spawn' porque o worker pode ter
+    threads, e um fork com threads rodando pode travar o processo filho.
+    """
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            _executor_pid = os.getpid()
+        return _executor
+
+def _discard_executor(executor):
+    """
+    Descarta um pool quebrado (um processo filho morreu, ex.: OOM killer), para a próxima chamada criar outro.
+    Outra thread pode já tê-lo trocado, então só descarta se ele ainda for o atual.
+    """
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+def _submit(func, *args):
+    """
+    Roda func no pool. Levanta HashingBusy se já houver MAX_PENDING hashes em andamento neste worker
+    ou se o pool quebrou (ele é recriado na próxima chamada).
+    """
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    executor = _get_executor()
+    try:
+        future = executor.submit(func, *args)
+    except BrokenProcessPool:
+        _slots.release()
+        _discard_executor(executor)
+        raise HashingBusy()
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda f: _slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        raise HashingBusy()
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        raise HashingBusy()
+
+def _verify(stored_hash, password, method):
+    """
+    Roda no processo do pool: confere a senha e, se ela estiver certa mas o hash usar parâmetros
+    antigos, já devolve o hash novo (evita uma segunda ida ao pool).
+    """
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if stored_hash.split('$', 1)[0] != method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+def hash_password(password):
+    """
+    Gera o hash de uma senha nova fora do processo do worker.
+    """
+    return _submit(generate_password_hash, password, HASH_METHOD)
+
+def verify_password(stored_hash, password):
+    """
+    Confere a senha fora do processo do worker.
+    Retorna (senha correta, hash novo ou None). Quando vier um hash novo, a rota deve gravá-lo no lugar do antigo.
+    """
+    return _submit(_verify, stored_hash, password, HASH_METHOD)
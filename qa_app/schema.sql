@@ -0,0 +1,128 @@
+CREATE TABLE IF NOT EXISTS users(
+	id  integer primary key autoincrement,
+	name text not null,
+	password text not null,
+	expert boolean not null,
+	admin boolean not null
+);
+
+CREATE TABLE IF NOT EXISTS questions(
+	id integer primary key autoincrement,
+	question_text text not null,
+	answer_text text,
+	asked_by_id integer not null,
+	expert_id integer not null
+);
+
+-- Versão dos dados de cada tabela, usada para invalidar os caches de todos os workers.
+-- Os triggers incrementam a versão a cada escrita, qualquer que seja a rota que escreveu.
+CREATE TABLE IF NOT EXISTS data_version (
+	name text primary key,
+	version integer not null
+);
+
+INSERT OR IGNORE INTO data_version (name, version) VALUES ('users', 1);
+
+CREATE TRIGGER IF NOT EXISTS users_version_update AFTER UPDATE ON users
+BEGIN
+	UPDATE data_version SET version = version + 1 WHERE name = 'users';
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_version_delete AFTER DELETE ON users
+BEGIN
+	UPDATE data_version SET version = version + 1 WHERE name = 'users';
+END;
+
+INSERT OR IGNORE INTO data_version (name, version) VALUES ('questions', 1);
+
+CREATE TRIGGER IF NOT EXISTS questions_version_insert AFTER INSERT ON questions
+BEGIN
+	UPDATE data_version SET version = version + 1 WHERE name = 'questions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS questions_version_update AFTER UPDATE ON questions
+BEGIN
+	UPDATE data_version SET version = version + 1 WHERE name = 'questions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS questions_version_delete AFTER DELETE ON questions
+BEGIN
+	UPDATE data_version SET version = version + 1 WHERE name = 'questions';
+END;
+
+-- Muda só quando uma resposta é gravada (ou uma pergunta apagada), não a cada pergunta nova:
+-- invalida as páginas de perguntas respondidas (answered_cache e ETag) sem descartá-las a cada ask()
+INSERT OR IGNORE INTO data_version (name, version) VALUES ('answers', 1);
+
+CREATE TRIGGER IF NOT EXISTS answers_version_update AFTER UPDATE OF answer_text ON questions
+BEGIN
+	UPDATE data_version SET version = version + 1 WHERE name = 'answers';
+END;
+
+CREATE TRIGGER IF NOT EXISTS answers_version_delete AFTER DELETE ON questions
+BEGIN
+	UPDATE data_version SET version = version + 1 WHERE name = 'answers';
+END;
+
+-- Busca textual (/search) nas perguntas e respostas.
+-- Tabela FTS5 de conteúdo externo: guarda só o índice, o texto continua em questions.
+-- As perguntas que já existiam são indexadas por migrations/0002_backfill.sql
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+	question_text,
+	answer_text,
+	content='questions',
+	content_rowid='id',
+	tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions
+BEGIN
+	INSERT INTO questions_fts (rowid, question_text, answer_text) VALUES (NEW.id, NEW.question_text, NEW.answer_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE OF question_text, answer_text ON questions
+BEGIN
+	INSERT INTO questions_fts (questions_fts, rowid, question_text, answer_text) VALUES ('delete', OLD.id, OLD.question_text, OLD.answer_text);
+	INSERT INTO questions_fts (rowid, question_text, answer_text) VALUES (NEW.id, NEW.question_text, NEW.answer_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions
+BEGIN
+	INSERT INTO questions_fts (questions_fts, rowid, question_text, answer_text) VALUES ('delete', OLD.id, OLD.question_text, OLD.answer_text);
+END;
+
+-- Quantidade de perguntas esperando resposta por expert, mostrada no menu (show_links).
+-- Mantida pelos triggers abaixo, para o menu não precisar de um COUNT(*) a cada página.
+-- Os contadores das perguntas que já existiam são calculados por migrations/0002_backfill.sql
+CREATE TABLE IF NOT EXISTS expert_pending (
+	expert_id integer primary key,
+	pending integer not null
+);
+
+CREATE TRIGGER IF NOT EXISTS expert_pending_insert AFTER INSERT ON questions WHEN NEW.answer_text IS NULL
+BEGIN
+	INSERT INTO expert_pending (expert_id, pending) VALUES (NEW.expert_id, 1)
+		ON CONFLICT (expert_id) DO UPDATE SET pending = pending + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS expert_pending_update AFTER UPDATE OF answer_text, expert_id ON questions
+BEGIN
+	UPDATE expert_pending SET pending = pending - 1 WHERE OLD.answer_text IS NULL AND expert_id = OLD.expert_id;
+	INSERT INTO expert_pending (expert_id, pending) SELECT NEW.expert_id, 1 WHERE NEW.answer_text IS NULL
+		ON CONFLICT (expert_id) DO UPDATE SET pending = pending + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS expert_pending_delete AFTER DELETE ON questions WHEN OLD.answer_text IS NULL
+BEGIN
+	UPDATE expert_pending SET pending = pending - 1 WHERE expert_id = OLD.expert_id;
+END;
+
+-- Eventos enviados por Server-Sent Events (/events): pergunta nova para o expert, resposta para quem perguntou.
+-- Cada worker lê as linhas novas e entrega às conexões abertas nele; linhas antigas são apagadas (events.EVENTS_TTL)
+CREATE TABLE IF NOT EXISTS events (
+	seq integer primary key autoincrement,
+	user_id integer not null,
+	kind text not null,
+	data text not null,
+	created_at real not null
+);
@@ -0,0 +1,68 @@
+from common.counters import CounterDatabase
+import threading
+import time
+
+
+# Banco separado do questions.db, compartilhado pelos workers do gunicorn na mesma máquina.
+# Guarda as falhas de login por nome de usuário e por IP
+DATABASE = 'login_throttle.db'
+
+USER_FREE_ATTEMPTS = 5  # Falhas seguidas permitidas para um nome de usuário antes do bloqueio
+IP_FREE_ATTEMPTS = 20  # Falhas permitidas para um IP (mais alto: vários usuários podem sair pelo mesmo IP)
+BASE_LOCKOUT = 1  # Segundos do primeiro bloqueio; dobra a cada nova falha
+MAX_LOCKOUT = 15 * 60  # Maior bloqueio, em segundos
+FORGET_AFTER = 60 * 60  # Segundos sem falhas depois dos quais a contagem recomeça do zero
+CLEANUP_EVERY = 1000  # A cada quantas falhas a thread apaga as chaves esquecidas
+
+counters = CounterDatabase(DATABASE, 'create table if not exists failures (key text primary key, count integer not null, last_failure real not null, locked_until real not null)')
+get_db = counters.get
+
+_local = threading.local()  # Falhas contadas por esta thread, para a limpeza a cada CLEANUP_EVERY
+
+
+def login_keys(name, ip):
+    """
+    Chaves contadas em cada tentativa, com o número de falhas livres de cada uma.
+    """
+    return [('user:' + name, USER_FREE_ATTEMPTS), ('ip:' + (ip or ''), IP_FREE_ATTEMPTS)]
+
+def locked_for(name, ip):
+    """
+    Segundos que ainda faltam para o usuário ou o IP poderem tentar de novo (0 se não estão bloqueados).
+    Só lê o banco, sem pegar o lock de escrita, e é chamada antes de qualquer hash de senha.
+    """
+    keys = [key for key, free_attempts in login_keys(name, ip)]
+    locked_until = get_db().execute('select max(locked_until) from failures where key in (?, ?)', keys).fetchone()[0]
+    return max(0, (locked_until or 0) - time.time())
+
+def record_failure(name, ip):
+    """
+    Conta uma falha para o usuário e para o IP. Passado o número de tentativas livres,
+    cada falha bloqueia a chave por BASE_LOCKOUT * 2^(falhas extras) segundos, até MAX_LOCKOUT.
+    """
+    sql = get_db()
+    now = time.time()
+    sql.execute('begin immediate')
+    try:
+        for key, free_attempts in login_keys(name, ip):
+            row = sql.execute('select count, last_failure from failures where key = ?', [key]).fetchone()
+            count = 1 if row is None or now - row[1] > FORGET_AFTER else row[0] + 1
+            locked_until = 0
+            if count > free_attempts:
+                locked_until = now + min(BASE_LOCKOUT * 2 ** (count - free_attempts - 1), MAX_LOCKOUT)
+            sql.execute('insert or replace into failures (key, count, last_failure, locked_until) values (?, ?, ?, ?)',
+                        [key, count, now, locked_until])
+        _local.failures = getattr(_local, 'failures', 0) + 1
+        if _local.failures % CLEANUP_EVERY == 0:
+            sql.execute('delete from failures where last_failure < ? and locked_until < ?', [now - FORGET_AFTER, now])
+        sql.execute('commit')
+    except Exception:
+        sql.execute('rollback')
+        raise
+
+def reset(name):
+    """
+    Login certo: zera as falhas do usuário. As do IP continuam, senão um atacante poderia
+    zerar o contador do IP entrando na própria conta entre as tentativas.
+    """
+    get_db().execute('delete from failures where key = ?', ['user:' + name])